@@ -0,0 +1,330 @@
+"""
+Benchmark suite for the quiz lifecycle.
+
+    python benchmarks/bench_quizzer.py                       # run, save baselines/<host>.json
+    python benchmarks/bench_quizzer.py --compare baselines/old.json
+
+Runs under Qt's offscreen platform plugin, so it works headless. Measures:
+
+    load            QuickQuiz.__init__ on generated banks of increasing size
+    tabulate        QuickQuiz.tabulate_score and result selection on a finished session
+    next_question   one question -> question transition
+    reset           a full "Try again" cycle
+    show_results    last answer -> result image on screen, from a local stub image
+                    server with cold caches and again with warm ones
+
+Every benchmark reports min / median / mean / p95 in milliseconds and the whole
+run is written out as JSON, so regressions show up as numbers.
+"""
+import os
+import sys
+from pathlib import Path
+import json
+import time
+import socket
+import platform
+import argparse
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / "src" / "main" / "python"))
+sys.path.insert(0, str(HERE))
+
+import numpy as np
+from PyQt5.QtCore import QT_VERSION_STR, QEvent
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QPixmapCache
+
+from quizzer import QuickQuiz
+from imagecache import ImageCache
+from stub_server import StubImageServer
+
+
+def stats(samples):
+    ms = np.asarray(samples) * 1000
+    return {
+        "n": len(ms),
+        "min": float(ms.min()),
+        "median": float(np.median(ms)),
+        "mean": float(ms.mean()),
+        "p95": float(np.percentile(ms, 95)),
+    }
+
+
+def make_quiz(n_qs, n_ans=4, n_results=63, image_url=None, prefetch=False):
+    """
+    Generated quiz shaped like whatjediareyou.json
+    """
+    return {
+        "Quiz Name": f"Benchmark {n_qs}",
+        "Options": {"Max Questions": 9999, "Random Order": True, "Prefetch Images": prefetch},
+        "Questions": [
+            {
+                "text": f"Question {ii}: which of these best describes how you'd handle situation number {ii}?",
+                "answers": [f"Answer {jj} to question {ii}, with a bit of extra text" for jj in range(n_ans)],
+            }
+            for ii in range(n_qs)
+        ],
+        "Results Header": "You are:",
+        "Results": [
+            {
+                "Name": f"Result {ii}",
+                "weight": 1 + ii % 3,
+                "image": image_url(ii) if image_url is not None else None,
+                "description": f"Description of result {ii}.",
+            }
+            for ii in range(n_results)
+        ],
+    }
+
+
+def answer(diag, value=1):
+    """
+    Answer the current question the same way a button click does
+    """
+    if diag.recycle:
+        view = diag.question_view
+    else:
+        view = diag.lay.itemAt(1).widget()
+    view.set_value(value)
+    view.procDone.emit(value)
+
+
+def settle(app):
+    """
+    Run pending events and actually delete anything deleteLater()'d, which processEvents()
+    alone never does outside a running event loop. Rebuilt widgets' teardown is part of the cost.
+    """
+    app.processEvents()
+    app.sendPostedEvents(None, QEvent.DeferredDelete)
+
+
+def finish(diag, app, timeout=30):
+    """
+    Spin the event loop until the result image is on screen
+    """
+    end = time.perf_counter() + timeout
+    while diag.pix_lab is not None and diag.pix_lab.pixmap() is None and time.perf_counter() < end:
+        app.processEvents()
+
+
+# Benchmarks -----------------------------------------------------------------
+
+def bench_load(app, tmp, sizes, repeat):
+    out = {}
+    for n_qs in sizes:
+        path = Path(tmp) / f"bank_{n_qs}.json"
+        with open(path, "w") as ff:
+            json.dump(make_quiz(n_qs), ff)
+
+        times = []
+        for ii in range(repeat):
+            start = time.perf_counter()
+            diag = QuickQuiz(path)
+            times.append(time.perf_counter() - start)
+            diag.deleteLater()
+            settle(app)
+
+        out[str(n_qs)] = stats(times)
+    return out
+
+
+def bench_tabulate(app, repeat):
+    diag = QuickQuiz(make_quiz(13))
+    while not diag.engine.finished:
+        answer(diag, int(diag.engine.rng.integers(0, 4)))
+
+    times_score = []
+    times_select = []
+    for ii in range(repeat):
+        start = time.perf_counter()
+        diag.tabulate_score()
+        times_score.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        diag.engine.finalize()
+        times_select.append(time.perf_counter() - start)
+
+    return {"tabulate_score": stats(times_score), "select_result": stats(times_select)}
+
+
+def bench_next_question(app, repeat, recycle):
+    diag = QuickQuiz(make_quiz(repeat + 1), recycle=recycle)
+    diag.show()
+
+    times = []
+    for ii in range(repeat):
+        start = time.perf_counter()
+        answer(diag)
+        settle(app)
+        times.append(time.perf_counter() - start)
+
+    diag.close()
+    return stats(times)
+
+
+def bench_reset(app, repeat, recycle):
+    diag = QuickQuiz(make_quiz(13), recycle=recycle)
+    diag.show()
+
+    times = []
+    for ii in range(repeat):
+        while not diag.engine.finished:
+            answer(diag)
+        settle(app)
+
+        start = time.perf_counter()
+        diag.reset()
+        settle(app)
+        times.append(time.perf_counter() - start)
+
+    diag.close()
+    return stats(times)
+
+
+def bench_show_results(app, tmp, repeat):
+    out = {}
+    with StubImageServer() as server:
+        cache = ImageCache(cache_dir=Path(tmp) / "image_cache")
+
+        for label in ("cold", "warm"):
+            times = []
+            for ii in range(repeat):
+                if label == "cold":
+                    # Unique urls and an empty pixmap cache, so every run downloads and decodes
+                    QPixmapCache.clear()
+                    urls = lambda jj, ii=ii: server.url(f"cold_{ii}_{jj}.jpg")
+                else:
+                    urls = lambda jj: server.url(f"warm_{jj}.jpg")
+
+                diag = QuickQuiz(make_quiz(13, image_url=urls, prefetch=(label == "warm")), image_cache=cache)
+                diag.show()
+
+                if label == "warm": # Let prefetching finish, like a user still answering would
+                    end = time.perf_counter() + 30
+                    while not diag.prefetch_started and time.perf_counter() < end:
+                        app.processEvents() # prefetching starts after the first paint
+                    app.processEvents()
+                    while diag.img_loader.pending and time.perf_counter() < end:
+                        app.processEvents()
+
+                while diag.engine.cur_q_idx < diag.engine.pbar_end - 1:
+                    answer(diag)
+                app.processEvents()
+
+                start = time.perf_counter()
+                answer(diag)
+                finish(diag, app)
+                times.append(time.perf_counter() - start)
+
+                diag.close()
+                diag.deleteLater()
+                settle(app)
+
+            out[label] = stats(times)
+        out["server_hits"] = server.hits
+
+    return out
+
+
+# Running --------------------------------------------------------------------
+
+def run(args):
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        results["load"] = bench_load(app, tmp, args.sizes, args.repeat)
+        results["tabulate"] = bench_tabulate(app, args.repeat * 10)
+        results["next_question"] = {
+            "recycle": bench_next_question(app, args.repeat * 5, True),
+            "rebuild": bench_next_question(app, args.repeat * 5, False),
+        }
+        results["reset"] = {
+            "recycle": bench_reset(app, args.repeat, True),
+            "rebuild": bench_reset(app, args.repeat, False),
+        }
+        results["show_results"] = bench_show_results(app, tmp, args.repeat)
+
+    return {
+        "meta": {
+            "host": socket.gethostname(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "qt": QT_VERSION_STR,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def flatten(tree, prefix=""):
+    """
+    {"a": {"b": {"median": ..}}} -> {"a.b": {"median": ..}}
+    """
+    out = {}
+    for key, val in tree.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(val, dict) and "median" in val:
+            out[name] = val
+        elif isinstance(val, dict):
+            out.update(flatten(val, name))
+    return out
+
+
+def compare(new, old, threshold):
+    """
+    Print median changes against an old run, returns the names that regressed
+    """
+    new_flat = flatten(new["results"])
+    old_flat = flatten(old["results"])
+
+    regressed = []
+    for name, row in sorted(new_flat.items()):
+        if name not in old_flat:
+            continue
+        ratio = row["median"] / max(old_flat[name]["median"], 1e-9)
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print(f"{name:<40} {old_flat[name]['median']:10.3f} -> {row['median']:10.3f} ms  x{ratio:5.2f}{flag}")
+
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quizzer benchmark suite")
+    parser.add_argument("--repeat", type=int, default=10, help="samples per benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[13, 100, 1000, 10000], help="bank sizes for the load benchmark")
+    parser.add_argument("--out", type=Path, default=None, help="where to save the run, defaults to baselines/<host>.json")
+    parser.add_argument("--compare", type=Path, default=None, help="baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="fractional slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    out = args.out if args.out is not None else HERE / "baselines" / f"{report['meta']['host']}.json"
+    with open(out, "w") as ff:
+        json.dump(report, ff, indent=4)
+
+    for name, row in sorted(flatten(report["results"]).items()):
+        print(f"{name:<40} median {row['median']:10.3f} ms   p95 {row['p95']:10.3f} ms")
+    print(f"saved to {out}")
+
+    if args.compare is not None:
+        with open(args.compare) as ff:
+            old = json.load(ff)
+        print()
+        if compare(report, old, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
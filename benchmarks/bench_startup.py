@@ -0,0 +1,203 @@
+"""
+Cold start budget check.
+
+    python benchmarks/bench_startup.py                 # check against baselines/startup_budget.json
+    python benchmarks/bench_startup.py --repeat 10 --out startup.json
+
+Every measurement runs in a fresh interpreter so nothing is already imported:
+
+    import      python -X importtime for the app modules, plus how much of that
+                is numpy / PyQt5 / requests / PIL
+    paint       wall time from spawning the process to the launcher's first paint,
+                and to the first question of a quiz being painted
+
+It also checks that the modules listed under "deferred" in the budget (requests
+and PIL) are not loaded by the time either window is first painted. Exits 1 if
+anything is over budget.
+"""
+import os
+import sys
+from pathlib import Path
+import json
+import time
+import argparse
+import subprocess
+
+HERE = Path(__file__).resolve().parent
+SRC = HERE.parent / "src" / "main" / "python"
+
+WATCH = ("numpy", "PyQt5", "requests", "PIL", "fbs_runtime")
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["PYTHONPATH"] = os.pathsep.join([str(SRC), env.get("PYTHONPATH", "")])
+    return env
+
+
+def import_time(module):
+    """
+    Cumulative import time of module and the watched packages in ms, from a cold interpreter
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=SRC, env=child_env(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr}")
+
+    out = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1]) / 1000
+        except ValueError: # header line
+            continue
+        name = parts[2].strip()
+        if name == module or name in WATCH:
+            out[name] = cumulative
+    return out
+
+
+def first_paint():
+    """
+    Time to first paint of the launcher and the first question, in a cold interpreter
+    """
+    spawned = time.time()
+    proc = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--child", str(spawned)],
+                          cwd=SRC, env=child_env(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup child failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def child(spawned):
+    """
+    Runs in the fresh interpreter: show the launcher, then a quiz, and note when each first paints
+    """
+    from PyQt5.QtCore import QObject, QEvent
+    from PyQt5.QtWidgets import QApplication
+
+    marks = {}
+
+    class PaintWatcher(QObject):
+        def __init__(self, name):
+            super(PaintWatcher, self).__init__()
+            self.name = name
+
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and self.name not in marks:
+                marks[self.name] = {
+                    "ms": (time.time() - spawned) * 1000,
+                    "loaded": sorted(x for x in WATCH if x in sys.modules),
+                }
+            return False
+
+    def wait_for(name, timeout=60):
+        end = time.perf_counter() + timeout
+        while name not in marks and time.perf_counter() < end:
+            app.processEvents()
+
+    app = QApplication(sys.argv)
+
+    from main import QuizLauncher
+    launcher = QuizLauncher()
+    watch_launcher = PaintWatcher("launcher")
+    launcher.installEventFilter(watch_launcher)
+    launcher.show()
+    wait_for("launcher")
+
+    # Same as picking the first quiz and pressing Launch, minus the modal exec_
+    name = launcher.catalog.names()[0]
+    from quizzer import QuickQuiz
+    diag = QuickQuiz(launcher.catalog.path(name))
+    watch_question = PaintWatcher("question")
+    diag.question_view.installEventFilter(watch_question)
+    diag.show()
+    wait_for("question")
+
+    print(json.dumps(marks))
+    return 0
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def run(args, budget):
+    imports = {}
+    for module in budget["import"]:
+        runs = [import_time(module) for ii in range(args.repeat)]
+        imports[module] = {name: median([x.get(name, 0.0) for x in runs]) for name in runs[0]}
+
+    runs = [first_paint() for ii in range(args.repeat)]
+    paint = {
+        name: {
+            "ms": median([x[name]["ms"] for x in runs]),
+            "loaded": sorted(set().union(*[x[name]["loaded"] for x in runs])),
+        }
+        for name in runs[0]
+    }
+
+    return {"import": imports, "paint": paint}
+
+
+def check(report, budget):
+    """
+    Print every measurement next to its budget, returns the list of violations
+    """
+    violations = []
+
+    for module, limit in budget["import"].items():
+        row = report["import"][module]
+        flag = ""
+        if row[module] > limit:
+            flag = "  OVER BUDGET"
+            violations.append(f"import {module}")
+        extra = ", ".join(f"{name} {ms:.1f}" for name, ms in sorted(row.items()) if name != module)
+        print(f"import {module:<20} {row[module]:9.1f} ms  (budget {limit:7.1f}){flag}   [{extra}]")
+
+    for name, limit in budget["paint"].items():
+        row = report["paint"][name]
+        flag = ""
+        if row["ms"] > limit:
+            flag = "  OVER BUDGET"
+            violations.append(f"paint {name}")
+
+        early = [x for x in budget.get("deferred", []) if x in row["loaded"]]
+        if early:
+            flag += f"  LOADED EARLY: {', '.join(early)}"
+            violations.append(f"deferred {name}")
+        print(f"paint  {name:<20} {row['ms']:9.1f} ms  (budget {limit:7.1f}){flag}   loaded: {', '.join(row['loaded'])}")
+
+    return violations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quizzer cold start budget check")
+    parser.add_argument("--repeat", type=int, default=5, help="cold starts per measurement")
+    parser.add_argument("--budget", type=Path, default=HERE / "baselines" / "startup_budget.json", help="budget file")
+    parser.add_argument("--out", type=Path, default=None, help="write the measurements as JSON")
+    parser.add_argument("--child", type=float, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        return child(args.child)
+
+    with open(args.budget) as ff:
+        budget = json.load(ff)
+
+    report = run(args, budget)
+    if args.out is not None:
+        with open(args.out, "w") as ff:
+            json.dump(report, ff, indent=4)
+
+    violations = check(report, budget)
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
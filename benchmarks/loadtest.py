@@ -0,0 +1,420 @@
+"""
+Load generator for simulated quiz takers.
+
+    python benchmarks/loadtest.py                                  # headless engine, 4 processes
+    python benchmarks/loadtest.py --mode server --takers 2000 --think 0.5
+    python benchmarks/loadtest.py --mode server --url http://127.0.0.1:8080 --quiz whatjediareyou
+
+Every process runs an asyncio loop of takers. Each taker starts a session,
+answers every question (waiting an exponentially distributed think time between
+answers) and optionally fetches its result image, then starts over. Answers
+come from --answers:
+
+    uniform         every answer equally likely
+    first           always the first answer
+    fixed:N         always answer N (clipped to the question)
+    zipf:S          answer a with probability proportional to 1 / (a + 1)^S
+
+--mode headless drives QuizEngine sessions directly. --mode server drives
+server.py over HTTP, starting one locally unless --url is given. With --images
+the quiz's result images are rewritten to point at a local stub image server,
+so it all runs offline.
+
+The report has throughput, p50/p95/p99 latency per step and RSS growth of every
+generator process (and of the server, when it was started here).
+"""
+import os
+import sys
+from pathlib import Path
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+HERE = Path(__file__).resolve().parent
+SRC = HERE.parent / "src" / "main" / "python"
+sys.path.insert(0, str(SRC))
+sys.path.insert(0, str(HERE))
+
+import numpy as np
+
+
+# Helpers --------------------------------------------------------------------
+
+def rss_bytes(pid="self"):
+    """
+    Current resident set size of a process, 0 if it can't be read
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as ff:
+            return int(ff.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        if pid != "self":
+            return 0
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def choose_answer(rng, n_ans, dist):
+    """
+    Draw an answer index from the configured distribution
+    """
+    kind, _, arg = dist.partition(":")
+    if kind == "first":
+        return 0
+    if kind == "fixed":
+        return min(int(arg), n_ans - 1)
+    if kind == "zipf":
+        p = 1.0 / np.arange(1, n_ans + 1) ** float(arg or 1.0)
+        return int(rng.choice(n_ans, p=p / p.sum()))
+    return int(rng.integers(0, n_ans))
+
+
+async def think(rng, mean):
+    # Always yield, with no think time headless takers would otherwise never let the others run
+    await asyncio.sleep(rng.exponential(mean) if mean > 0 else 0)
+
+
+class HTTPClient(object):
+    """
+    Bare bones keep-alive HTTP/1.1 JSON client on asyncio streams
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None, raw=False):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        data = json.dumps(body).encode() if body is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+                          + data)
+        await self.writer.drain()
+
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split()[1])
+        headers = dict(line.split(":", 1) for line in head[1:] if ":" in line)
+        length = int(headers.get("Content-Length", headers.get("content-length", 0)))
+        payload = await self.reader.readexactly(length) if length else b""
+
+        if raw:
+            return status, payload
+        return status, json.loads(payload) if payload else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+async def fetch_image(url, clients):
+    """
+    GET a result image over a per-host keep-alive connection, returns the byte count
+    """
+    parts = urlsplit(url)
+    client = clients.get(parts.netloc, None)
+    if client is None:
+        client = clients[parts.netloc] = HTTPClient(parts.hostname, parts.port or 80)
+    status, payload = await client.request("GET", parts.path or "/", raw=True)
+    if status != 200:
+        raise RuntimeError(f"Image fetch failed with {status}")
+    return len(payload)
+
+
+def reset_clients(clients):
+    """
+    Drop every connection, the next request on each reconnects
+    """
+    for client in clients.values():
+        client.close()
+
+
+# Takers ---------------------------------------------------------------------
+
+async def headless_taker(engine, cfg, rng, timings, deadline):
+    clients = {}
+    done = 0
+    while time.monotonic() < deadline:
+        try:
+            await headless_session(engine, cfg, rng, timings, clients)
+            done += 1
+        except (OSError, asyncio.IncompleteReadError, RuntimeError):
+            timings["errors"] += 1
+            reset_clients(clients)
+
+    reset_clients(clients)
+    timings["takers_run"] += done > 0
+
+
+async def headless_session(engine, cfg, rng, timings, clients):
+    start = time.perf_counter()
+    session = engine.new_session()
+    timings["create"].append(time.perf_counter() - start)
+
+    while not session.finished:
+        await think(rng, cfg["think"])
+        start = time.perf_counter()
+        session.record_answer(choose_answer(rng, int(engine.n_ans[session.question_index()]), cfg["answers"]))
+        engine.advance_session(session)
+        timings["answer"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    result = engine.results[engine.complete_session(session)]
+    timings["result"].append(time.perf_counter() - start)
+
+    if cfg["images"] and result.get("image", None):
+        start = time.perf_counter()
+        await fetch_image(result["image"], clients)
+        timings["image"].append(time.perf_counter() - start)
+
+    timings["sessions"] += 1
+
+
+async def server_taker(cfg, rng, timings, deadline):
+    parts = urlsplit(cfg["url"])
+    clients = {"api": HTTPClient(parts.hostname, parts.port)}
+    done = 0
+
+    while time.monotonic() < deadline:
+        try:
+            await server_session(cfg, rng, timings, clients)
+            done += 1
+        except (OSError, asyncio.IncompleteReadError, RuntimeError):
+            timings["errors"] += 1
+            reset_clients(clients)
+
+    reset_clients(clients)
+    timings["takers_run"] += done > 0
+
+
+async def server_session(cfg, rng, timings, clients):
+    client = clients["api"]
+
+    start = time.perf_counter()
+    status, state = await client.request("POST", "/sessions", {"quiz": cfg["quiz"]})
+    timings["create"].append(time.perf_counter() - start)
+    if status != 201:
+        raise RuntimeError(f"Session create failed with {status}")
+
+    while not state["finished"]:
+        await think(rng, cfg["think"])
+        answer = choose_answer(rng, len(state["question"]["answers"]), cfg["answers"])
+        start = time.perf_counter()
+        status, state = await client.request("POST", f"/sessions/{state['session']}/answer", {"answer": answer})
+        timings["answer"].append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError(f"Answer failed with {status}")
+
+    start = time.perf_counter()
+    status, result = await client.request("GET", f"/sessions/{state['session']}/result")
+    timings["result"].append(time.perf_counter() - start)
+
+    if cfg["images"] and result.get("image", None):
+        start = time.perf_counter()
+        await fetch_image(result["image"], clients)
+        timings["image"].append(time.perf_counter() - start)
+
+    timings["sessions"] += 1
+
+
+def run_worker(cfg, n_takers, seed):
+    """
+    One generator process: n_takers concurrent takers for cfg["duration"] seconds
+    """
+    timings = {"create": [], "answer": [], "result": [], "image": [], "sessions": 0, "errors": 0, "takers_run": 0}
+    rngs = [np.random.default_rng(x) for x in np.random.SeedSequence(seed).spawn(n_takers)]
+
+    engine = None
+    if cfg["mode"] == "headless":
+        from engine import QuizEngine
+        engine = QuizEngine(cfg["quiz_file"], seed=seed)
+
+    rss_start = rss_bytes()
+
+    async def main():
+        deadline = time.monotonic() + cfg["duration"]
+        if engine is not None:
+            takers = [headless_taker(engine, cfg, rng, timings, deadline) for rng in rngs]
+        else:
+            takers = [server_taker(cfg, rng, timings, deadline) for rng in rngs]
+        await asyncio.gather(*takers)
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - start
+
+    timings["seconds"] = elapsed
+    timings["rss_start"] = rss_start
+    timings["rss_end"] = rss_bytes()
+    return timings
+
+
+# Orchestration --------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(quiz_dir, port, timeout=30):
+    proc = subprocess.Popen([sys.executable, str(SRC / "server.py"), "--dir", str(quiz_dir), "--port", str(port)],
+                            cwd=SRC, stdout=subprocess.DEVNULL)
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Quiz server didn't start")
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000
+    return {
+        "n": len(ms),
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+        "max": float(ms.max()),
+    }
+
+
+def run(args):
+    quiz_file = Path(args.quiz_file).resolve()
+    quiz = quiz_file.stem
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stub = None
+        if args.images:
+            # Point every result image at a local stub so nothing leaves the machine
+            from stub_server import StubImageServer
+            stub = StubImageServer().start()
+
+            with open(quiz_file) as ff:
+                config = json.load(ff)
+            for ii, res in enumerate(config.get("Results", [])):
+                res["image"] = stub.url(f"{quiz}_{ii}.jpg")
+
+            quiz_file = Path(tmp) / quiz_file.name
+            with open(quiz_file, "w") as ff:
+                json.dump(config, ff)
+
+        url, server = args.url, None
+        if args.mode == "server" and url is None:
+            port = free_port()
+            server = start_server(quiz_file.parent, port)
+            url = f"http://127.0.0.1:{port}"
+        server_rss = rss_bytes(server.pid) if server is not None else 0
+
+        cfg = {
+            "mode": args.mode,
+            "quiz": args.quiz or quiz,
+            "quiz_file": str(quiz_file),
+            "url": url,
+            "think": args.think,
+            "answers": args.answers,
+            "images": args.images,
+            "duration": args.duration,
+        }
+
+        # Spread the takers over the processes
+        per_proc = [args.takers // args.processes + (ii < args.takers % args.processes) for ii in range(args.processes)]
+
+        try:
+            with ProcessPoolExecutor(max_workers=args.processes) as pool:
+                futures = [pool.submit(run_worker, cfg, n, args.seed + ii) for ii, n in enumerate(per_proc) if n]
+                workers = [fut.result() for fut in futures]
+            server_rss_end = rss_bytes(server.pid) if server is not None else 0
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+            if stub is not None:
+                stub.stop()
+
+    seconds = max(x["seconds"] for x in workers)
+    sessions = sum(x["sessions"] for x in workers)
+    answers = sum(len(x["answer"]) for x in workers)
+
+    return {
+        "config": dict(cfg, takers=args.takers, processes=args.processes),
+        "seconds": seconds,
+        "sessions": sessions,
+        "takers_run": sum(x["takers_run"] for x in workers),
+        "errors": sum(x["errors"] for x in workers),
+        "throughput": {"sessions_per_s": sessions / seconds, "answers_per_s": answers / seconds},
+        "latency": {step: percentiles([t for x in workers for t in x[step]])
+                    for step in ("create", "answer", "result", "image")},
+        "memory": {
+            "workers": [{"rss_start": x["rss_start"], "rss_end": x["rss_end"], "growth": x["rss_end"] - x["rss_start"]}
+                        for x in workers],
+            "server": {"rss_start": server_rss, "rss_end": server_rss_end, "growth": server_rss_end - server_rss}
+                      if server is not None else None,
+        },
+    }
+
+
+def print_report(report):
+    cfg = report["config"]
+    print(f"{cfg['mode']} load test: {cfg['takers']} takers over {cfg['processes']} processes, "
+          f"think {cfg['think']}s, answers {cfg['answers']}")
+    print(f"{report['sessions']} sessions in {report['seconds']:.1f}s, {report['errors']} errors")
+    print(f"{report['takers_run']} of {cfg['takers']} takers finished at least one session")
+    print(f"throughput: {report['throughput']['sessions_per_s']:.1f} sessions/s, "
+          f"{report['throughput']['answers_per_s']:.1f} answers/s")
+
+    print("latency (ms)          n       p50       p95       p99       max")
+    for step, row in report["latency"].items():
+        if row is not None:
+            print(f"    {step:<10} {row['n']:8d} {row['p50']:9.3f} {row['p95']:9.3f} {row['p99']:9.3f} {row['max']:9.3f}")
+
+    mb = 1024 * 1024
+    for ii, row in enumerate(report["memory"]["workers"]):
+        print(f"worker {ii} rss {row['rss_start'] / mb:.1f} -> {row['rss_end'] / mb:.1f} MB")
+    if report["memory"]["server"] is not None:
+        row = report["memory"]["server"]
+        print(f"server rss {row['rss_start'] / mb:.1f} -> {row['rss_end'] / mb:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated quiz taker load test")
+    parser.add_argument("quiz_file", nargs="?", default=str(SRC / "whatjediareyou.json"), help="quiz json file")
+    parser.add_argument("--mode", choices=("headless", "server"), default="headless", help="what to drive")
+    parser.add_argument("--url", default=None, help="existing server to hit, otherwise one is started")
+    parser.add_argument("--quiz", default=None, help="quiz name on the server, defaults to the file's stem")
+    parser.add_argument("--takers", type=int, default=1000, help="concurrent simulated takers")
+    parser.add_argument("--processes", type=int, default=4, help="generator processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run for")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between answers in seconds")
+    parser.add_argument("--answers", default="uniform", help="uniform, first, fixed:N or zipf:S")
+    parser.add_argument("--images", action="store_true", help="fetch result images from a local stub server")
+    parser.add_argument("--seed", type=int, default=0, help="base random seed")
+    parser.add_argument("--json", type=Path, default=None, help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+
+    if args.json is not None:
+        with open(args.json, "w") as ff:
+            json.dump(report, ff, indent=4)
+
+    return 1 if report["errors"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
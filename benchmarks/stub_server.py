@@ -0,0 +1,90 @@
+"""
+Local stand-in for the image host used by Results[].image.
+
+Serves the same generated image for every path (with an ETag so conditional
+requests get a 304) from a background thread, so benchmarks and load tests can
+run offline.
+"""
+import io
+import threading
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+def make_image(width=1200, height=1800, fmt="JPEG"):
+    """
+    Encoded test image, portrait like most of the result images
+    """
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=90)
+    return buf.getvalue()
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # Load tests open hundreds of connections at once, the default listen backlog is 5
+    request_queue_size = 1024
+
+
+class StubImageServer(object):
+    """
+    Minimal threaded HTTP image server on localhost
+    """
+
+    def __init__(self, payload=None, content_type="image/jpeg", port=0):
+        self.payload = payload if payload is not None else make_image()
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha256(self.payload).hexdigest()[:16] + '"'
+        self.hits = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.hits += 1
+
+                if self.headers.get("If-None-Match", None) == server.etag:
+                    self.send_response(304)
+                    self.send_header("ETag", server.etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", server.content_type)
+                self.send_header("Content-Length", str(len(server.payload)))
+                self.send_header("ETag", server.etag)
+                self.end_headers()
+                self.wfile.write(server.payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = StubHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def url(self, name="image.jpg"):
+        return f"http://127.0.0.1:{self.port}/{name}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
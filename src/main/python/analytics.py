@@ -0,0 +1,337 @@
+"""
+Running quiz analytics built from mergeable counters.
+
+    python analytics.py ~/.quizzer/analytics              # report on every process' snapshot
+    python analytics.py --from-log ~/.quizzer/sessions    # rebuild the counters from a session log
+
+Per quiz this keeps:
+
+    answers     bank question x answer code counts for the questions sessions were asked
+                (code 0 = asked but left unanswered)
+    results     how often each result was picked, reported next to its configured weight
+    finished    sessions completed after being asked n questions, short when it finished early
+    dropped     sessions abandoned after answering n questions, for drop-off by question index
+
+Everything is a plain count, so updating is a bincount as each session completes
+and combining processes is just adding arrays. Each process writes a snapshot of its
+own counters into a shared directory and readers add the snapshots together.
+"""
+import os
+import sys
+from pathlib import Path
+import json
+import time
+import socket
+import atexit
+import argparse
+import threading
+
+import numpy as np
+
+
+def pad_to(arr, shape):
+    """
+    Zero pad a counter array up to shape, quizzes can grow questions or results
+    """
+    if arr.shape == tuple(shape):
+        return arr
+    out = np.zeros(shape, dtype=arr.dtype)
+    out[tuple(slice(0, n) for n in arr.shape)] = arr
+    return out
+
+
+class QuizStats(object):
+    """
+    Counters for a single quiz
+    """
+
+    def __init__(self, n_qs=0, n_codes=1, n_results=0, weights=None, n_steps=0, **kwargs):
+        self.kwargs = kwargs
+
+        # answers is indexed by bank question, finished and dropped by how far into the session it got
+        self.answers = np.zeros((n_qs, n_codes), dtype=np.int64)
+        self.results = np.zeros(n_results, dtype=np.int64)
+        self.finished = np.zeros(n_steps + 1, dtype=np.int64)
+        self.dropped = np.zeros(n_steps + 1, dtype=np.int64)
+        self.weights = np.zeros(n_results) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    @classmethod
+    def for_engine(cls, engine):
+        return cls(engine.bank_size, int(engine.max_ans) + 1, len(engine.results), engine.weights,
+                   int(engine.pbar_end))
+
+    def fit(self, n_qs, n_codes, n_results):
+        """
+        Grow the counters if they're too small for the incoming data
+        """
+        self.answers = pad_to(self.answers, (max(self.answers.shape[0], n_qs), max(self.answers.shape[1], n_codes)))
+        self.results = pad_to(self.results, (max(len(self.results), n_results),))
+        if len(self.weights) < len(self.results):
+            self.weights = np.concatenate([self.weights, np.zeros(len(self.results) - len(self.weights))])
+
+    @property
+    def completed(self):
+        return int(self.results.sum())
+
+    @property
+    def started(self):
+        return self.completed + int(self.dropped.sum())
+
+    def add_asked(self, questions, codes, results, n_asked):
+        """
+        Count finished sessions from the questions they were asked, questions (bank indices)
+        and codes are flat (question, answer code) pairs for every session and n_asked how
+        many of them each session had. Questions a session never got to aren't counted at all.
+        """
+        questions = np.asarray(questions, dtype=np.int64)
+        codes = np.asarray(codes, dtype=np.int64)
+        results = np.atleast_1d(np.asarray(results, dtype=np.int64))
+        n_asked = np.atleast_1d(np.asarray(n_asked, dtype=np.int64))
+        n_qs = int(questions.max(initial=-1)) + 1
+
+        self.fit(n_qs, int(codes.max(initial=0)) + 1, int(results.max(initial=-1)) + 1)
+        n_codes = self.answers.shape[1]
+
+        self.answers[:n_qs] += np.bincount(questions * n_codes + codes, minlength=n_qs * n_codes).reshape(n_qs, n_codes)
+        self.results += np.bincount(results, minlength=len(self.results))
+
+        finished = np.bincount(n_asked)
+        self.finished = pad_to(self.finished, (max(len(self.finished), len(finished)),))
+        self.finished[:len(finished)] += finished
+
+    def add_dropped(self, n_answered, count=1):
+        """
+        Count sessions abandoned after answering n_answered questions
+        """
+        if n_answered >= len(self.dropped):
+            self.dropped = pad_to(self.dropped, (n_answered + 1,))
+        self.dropped[n_answered] += count
+
+    def merge(self, other):
+        self.fit(other.answers.shape[0], other.answers.shape[1], len(other.results))
+        self.answers += pad_to(other.answers, self.answers.shape)
+        self.results += pad_to(other.results, self.results.shape)
+        self.finished = pad_to(self.finished, (max(len(self.finished), len(other.finished)),))
+        self.finished += pad_to(other.finished, self.finished.shape)
+        self.dropped = pad_to(self.dropped, (max(len(self.dropped), len(other.dropped)),))
+        self.dropped += pad_to(other.dropped, self.dropped.shape)
+        if not self.weights.any():
+            self.weights = pad_to(other.weights, self.weights.shape)
+        return self
+
+    def summary(self):
+        """
+        Query friendly view of the counters
+        """
+        completed = self.completed
+        started = self.started
+        # A session reached question ii if it finished or dropped after getting at least ii in
+        n_steps = max(len(self.finished), len(self.dropped))
+        ended = pad_to(self.finished, (n_steps,)) + pad_to(self.dropped, (n_steps,))
+        return {
+            "started": started,
+            "completed": completed,
+            "completion_rate": completed / started if started else 0.0,
+            "reached": np.cumsum(ended[::-1])[::-1].tolist(),
+            "finished": self.finished.tolist(),
+            "dropped": self.dropped.tolist(),
+            "results": {
+                "count": self.results.tolist(),
+                "frequency": (self.results / max(completed, 1)).tolist(),
+                "weight": self.weights.tolist(),
+            },
+            "answers": {
+                "unanswered": self.answers[:, 0].tolist(),
+                "count": self.answers[:, 1:].tolist(),
+            },
+        }
+
+    def to_dict(self):
+        return {
+            "answers": self.answers.tolist(),
+            "results": self.results.tolist(),
+            "finished": self.finished.tolist(),
+            "dropped": self.dropped.tolist(),
+            "weights": self.weights.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        if data["answers"]:
+            stats.answers = np.array(data["answers"], dtype=np.int64)
+        stats.results = np.array(data["results"], dtype=np.int64)
+        stats.finished = np.array(data["finished"], dtype=np.int64)
+        stats.dropped = np.array(data["dropped"], dtype=np.int64)
+        stats.weights = np.array(data["weights"], dtype=np.float64)
+        return stats
+
+
+class Analytics(object):
+    """
+    QuizStats for every quiz a process has seen. If given a directory the counters are
+    snapshotted there (one file per process) so other processes can merge them in.
+    """
+    version = 2
+
+    def __init__(self, directory=None, save_every=10.0, **kwargs):
+        self.kwargs = kwargs
+
+        self.directory = Path(directory) if directory is not None else None
+        self.save_every = save_every
+        self.last_save = time.monotonic()
+        self.lock = threading.Lock()
+        self.quizzes = {}
+
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.snapshot_file = self.directory / f"{socket.gethostname()}-{os.getpid()}.json"
+            atexit.register(self.save)
+
+    def stats(self, quiz, engine=None):
+        stats = self.quizzes.get(quiz, None)
+        if stats is None:
+            stats = self.quizzes[quiz] = QuizStats.for_engine(engine) if engine is not None else QuizStats()
+        return stats
+
+    def session_completed(self, quiz, engine, questions, codes, result):
+        with self.lock:
+            self.stats(quiz, engine).add_asked(questions, codes, result, len(questions))
+        self.maybe_save()
+
+    def session_dropped(self, quiz, engine, n_answered):
+        with self.lock:
+            self.stats(quiz, engine).add_dropped(n_answered)
+        self.maybe_save()
+
+    def maybe_save(self):
+        if self.directory is not None and time.monotonic() - self.last_save > self.save_every:
+            self.save()
+
+    def merge(self, other):
+        with self.lock:
+            for quiz, stats in other.quizzes.items():
+                self.stats(quiz).merge(stats)
+        return self
+
+    def to_dict(self):
+        with self.lock:
+            return {"version": self.version, "quizzes": {k: v.to_dict() for k, v in self.quizzes.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        out = cls()
+        if data.get("version", None) == cls.version:
+            out.quizzes = {k: QuizStats.from_dict(v) for k, v in data.get("quizzes", {}).items()}
+        return out
+
+    def save(self, path=None):
+        """
+        Write this process' counters out, atomically so readers never see half a file
+        """
+        self.last_save = time.monotonic()
+        path = self.snapshot_file if path is None else Path(path)
+        tmp = path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w") as ff:
+                json.dump(self.to_dict(), ff)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Unable to save analytics: {e}")
+
+    @classmethod
+    def load_dir(cls, directory, skip=None):
+        """
+        Merge every snapshot in a directory
+        """
+        out = cls()
+        for path in sorted(Path(directory).glob("*.json")):
+            if skip is not None and path == skip:
+                continue
+            try:
+                with open(path) as ff:
+                    out.merge(cls.from_dict(json.load(ff)))
+            except (OSError, ValueError) as e:
+                print(f"Unable to read analytics snapshot {path}: {e}")
+        return out
+
+    def combined(self):
+        """
+        This process' live counters plus every other process' last snapshot
+        """
+        out = Analytics().merge(self)
+        if self.directory is not None:
+            out.merge(Analytics.load_dir(self.directory, skip=self.snapshot_file))
+        return out
+
+    def summary(self, quiz=None):
+        with self.lock:
+            if quiz is not None:
+                stats = self.quizzes.get(quiz, None)
+                return stats.summary() if stats is not None else None
+            return {k: v.summary() for k, v in self.quizzes.items()}
+
+    @classmethod
+    def from_log(cls, directory):
+        """
+        Rebuild the completed session counters from a session log in one pass
+        """
+        from sessionlog import load_log
+
+        out = cls()
+        for quiz, cols in load_log(directory).items():
+            out.stats(quiz).add_asked(cols["questions"], cols["codes"], cols["result"], cols["asked"])
+        return out
+
+
+analytics_dirs = {}
+
+
+def get_analytics(target=None):
+    """
+    Counters to update as sessions finish. A snapshot directory (or QUIZZER_ANALYTICS) gets one
+    shared Analytics per process, True keeps counts in memory only and False turns them off.
+    """
+    if isinstance(target, Analytics):
+        return target
+
+    if target is None:
+        target = os.environ.get("QUIZZER_ANALYTICS", None)
+    if target is True:
+        return Analytics()
+    if not target:
+        return None
+
+    target = str(Path(target).expanduser())
+    if target not in analytics_dirs:
+        analytics_dirs[target] = Analytics(target)
+    return analytics_dirs[target]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report on quiz analytics")
+    parser.add_argument("directory", type=Path, help="analytics snapshot directory, or a session log with --from-log")
+    parser.add_argument("--from-log", action="store_true", help="rebuild the counters from a session log instead")
+    parser.add_argument("--quiz", default=None, help="only this quiz")
+    args = parser.parse_args(argv)
+
+    analytics = Analytics.from_log(args.directory) if args.from_log else Analytics.load_dir(args.directory)
+
+    for quiz, summ in sorted(analytics.summary().items()):
+        if args.quiz is not None and quiz != args.quiz:
+            continue
+
+        print(f"{quiz}: {summ['completed']} of {summ['started']} sessions completed ({summ['completion_rate']:.1%})")
+        print("    reached by question: " + " ".join(str(x) for x in summ["reached"]))
+
+        res = summ["results"]
+        print("    result frequency vs weight")
+        for idx in np.argsort(-np.asarray(res["count"]))[:10]:
+            weight = res["weight"][idx] if idx < len(res["weight"]) else 0.0
+            print(f"        {idx:<5} {res['frequency'][idx]:8.4f} {weight:8.4f}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
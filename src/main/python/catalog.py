@@ -0,0 +1,171 @@
+import os
+from pathlib import Path
+import json
+import hashlib
+import threading
+
+
+class QuizCatalog(object):
+    """
+    Metadata for every quiz in a directory, cached in a sidecar file.
+
+    Each entry holds the quiz name, question and result counts, whether it looks
+    loadable, and the mtime/size/hash used to spot changes. refresh() only re-reads
+    files whose mtime or size moved, and only re-parses them if the content hash
+    actually changed, so browsing a large directory doesn't parse anything.
+    """
+    version = 2
+
+    def __init__(self, directory, cache_file=".quiz_catalog.cache", pattern="*.json", **kwargs):
+        self.kwargs = kwargs
+
+        self.directory = Path(directory)
+        self.cache_file = self.directory / cache_file
+        self.pattern = pattern
+
+        self.lock = threading.Lock()
+        self.entries = self.load_cache()
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file) as ff:
+                cache = json.load(ff)
+        except (OSError, ValueError):
+            return {}
+
+        if cache.get("version", None) != self.version:
+            return {}
+        return cache.get("entries", {})
+
+    def save_cache(self):
+        tmp = self.cache_file.with_suffix(".tmp")
+        try:
+            with open(tmp, "w") as ff:
+                json.dump({"version": self.version, "entries": self.entries}, ff)
+            os.replace(tmp, self.cache_file)
+        except OSError as e: # Read only install dirs still get a working catalog
+            print(f"Unable to save quiz catalog: {e}")
+
+    @staticmethod
+    def scan_file(path, data=None):
+        """
+        Parse a quiz file and pull out the metadata the launcher needs
+        """
+        if data is None:
+            data = path.read_bytes()
+
+        entry = {
+            "name": path.stem,
+            "title": path.stem,
+            "n_questions": 0,
+            "n_results": 0,
+            "valid": False,
+            "error": None,
+            "hash": hashlib.sha256(data).hexdigest(),
+        }
+
+        try:
+            config = json.loads(data)
+            questions = config.get("Questions", [])
+            results = config.get("Results", [])
+
+            entry["title"] = config.get("Quiz Name", path.stem)
+            entry["n_questions"] = len(questions)
+            entry["n_results"] = len(results)
+
+            if not questions:
+                raise ValueError("No questions")
+            if not results:
+                raise ValueError("No results")
+            if any(not q.get("answers", None) for q in questions):
+                raise ValueError("Question with no answers")
+
+            # Trait scores have to point at results that exist
+            names = set(x["Name"] for x in results)
+            for q in questions:
+                for ans in q["answers"]:
+                    scores = ans.get("scores", None) if isinstance(ans, dict) else None
+                    if isinstance(scores, dict) and not set(scores) <= names:
+                        raise ValueError(f"Answer scores unknown results {sorted(set(scores) - names)}")
+                    if isinstance(scores, list) and len(scores) != len(results):
+                        raise ValueError(f"Answer has {len(scores)} scores for {len(results)} results")
+            if sum(x["weight"] for x in results) <= 0:
+                raise ValueError("Result weights don't add up to anything")
+
+            entry["valid"] = True
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+
+        return entry
+
+    def refresh(self, names=None):
+        """
+        Bring the catalog up to date with the directory, returns the names that changed.
+        names limits the check to just those quizzes (a watcher knows which files moved),
+        otherwise every file in the directory is looked at.
+        """
+        with self.lock:
+            # Work on a copy and swap it in at the end, readers on other threads
+            # always see a whole catalog
+            entries = dict(self.entries)
+            changed = []
+            dirty = False
+
+            if names is None:
+                paths = list(self.directory.glob(self.pattern))
+                # Forget quizzes that have been removed
+                seen = set(path.stem for path in paths)
+                gone = [name for name in entries if name not in seen]
+            else:
+                paths = [self.path(name) for name in names if self.path(name).exists()]
+                gone = [name for name in names if name in entries and not self.path(name).exists()]
+
+            for name in gone:
+                del entries[name]
+                changed.append(name)
+
+            for path in paths:
+                name = path.stem
+
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+
+                old = entries.get(name, None)
+                if old is not None and old["mtime_ns"] == stat.st_mtime_ns and old["size"] == stat.st_size:
+                    continue
+
+                try:
+                    data = path.read_bytes()
+                except OSError:
+                    continue
+
+                # Touched but not changed, just remember the new mtime
+                if old is not None and old["hash"] == hashlib.sha256(data).hexdigest():
+                    entry = dict(old)
+                else:
+                    entry = self.scan_file(path, data)
+                    changed.append(name)
+
+                entry["mtime_ns"] = stat.st_mtime_ns
+                entry["size"] = stat.st_size
+                entries[name] = entry
+                dirty = True
+
+            self.entries = entries
+
+            # Rewriting the cache when nothing moved would just wake up anyone watching the directory
+            if dirty or changed or not self.cache_file.exists():
+                self.save_cache()
+
+        return changed
+
+    def names(self):
+        return sorted(self.entries)
+
+    def path(self, name):
+        return self.directory / (name + ".json")
+
+    def get(self, name):
+        return self.entries.get(name, None)
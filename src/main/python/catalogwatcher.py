@@ -0,0 +1,110 @@
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, QFileSystemWatcher, pyqtSignal
+
+from workers import safe_emit
+
+
+class RefreshSignals(QObject):
+    done = pyqtSignal(list)
+
+
+class RefreshTask(QRunnable):
+    """
+    Run a catalog refresh on the thread pool, only the quizzes in names are re-checked (None for all)
+    """
+
+    def __init__(self, catalog, names, signals):
+        super(RefreshTask, self).__init__()
+        self.catalog = catalog
+        self.names = names
+        self.signals = signals
+
+    def run(self):
+        try:
+            changed = self.catalog.refresh(self.names)
+        except Exception as e:
+            print(f"Unable to refresh quiz catalog: {e}")
+            changed = []
+
+        safe_emit(self.signals, "done", changed)
+
+
+class CatalogWatcher(QObject):
+    """
+    Keeps a QuizCatalog in sync with its directory while the app is running.
+
+    Edits to a quiz file queue just that quiz, files appearing or disappearing queue a
+    scan of the directory. Bursts of events (editors often write a file several times
+    per save) are collected for delay ms and then refreshed in one go on the thread
+    pool, so the GUI thread never reads or parses a quiz. changed is emitted on the GUI
+    thread with the names whose content actually changed.
+    """
+    changed = pyqtSignal(list)
+
+    def __init__(self, catalog, delay=300, pool=None, **kwargs):
+        super(CatalogWatcher, self).__init__()
+        self.kwargs = kwargs
+
+        self.catalog = catalog
+        self.pool = pool if pool is not None else QThreadPool.globalInstance()
+
+        self.queued = set()
+        self.scan_dir = False
+        self.running = False
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.start_refresh)
+
+        self.signals = RefreshSignals()
+        self.signals.done.connect(self.on_done)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_dir_changed)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        self.watcher.addPath(str(self.catalog.directory))
+        self.watch_files()
+
+    def watch_files(self):
+        """
+        Watch every quiz file in the catalog. Editors that save by replacing the file
+        drop it from the watcher, so this gets topped up after every refresh.
+        """
+        watched = set(self.watcher.files())
+        paths = [str(self.catalog.path(name)) for name in self.catalog.names()]
+        missing = [x for x in paths if x not in watched]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    def on_dir_changed(self, path):
+        self.scan_dir = True
+        self.timer.start()
+
+    def on_file_changed(self, path):
+        path = Path(path)
+        if path.match(self.catalog.pattern):
+            self.queued.add(path.stem)
+            self.timer.start()
+
+    def start_refresh(self):
+        # One refresh at a time, anything arriving meanwhile waits for the next
+        if self.running or not (self.queued or self.scan_dir):
+            return
+
+        names = None if self.scan_dir else sorted(self.queued)
+        self.queued = set()
+        self.scan_dir = False
+        self.running = True
+        self.pool.start(RefreshTask(self.catalog, names, self.signals))
+
+    def on_done(self, changed):
+        self.running = False
+        self.watch_files()
+
+        if changed:
+            self.changed.emit(changed)
+
+        if self.queued or self.scan_dir:
+            self.timer.start()
@@ -0,0 +1,503 @@
+import os
+from pathlib import Path
+import json
+import numpy as np
+
+from sampler import ResultSampler
+from quizbin import CompiledQuiz
+from streaming import stream_quiz
+from outcomes import build_table, load_table, save_table, strides, DEFAULT_LIMIT
+from tracing import get_tracer
+from session import QuizSession
+from sessionlog import get_session_log
+from analytics import get_analytics
+from traits import TraitScorer, has_scores, plain_questions, score_rows, score_matrix
+
+
+class QuizEngine(object):
+    """
+    Headless quiz core. Handles reading the config, question ordering, answer
+    storage and scoring without touching Qt, so sessions can be run and scored
+    from servers, batch jobs and benchmarks.
+    """
+
+    def __init__(self, quiz_config=None, **kwargs):
+        self.kwargs = kwargs
+
+        # Local generator for question ordering, never touch the global numpy state
+        self.rng = np.random.default_rng(kwargs.get("seed", None))
+
+        self.working_dir = Path(os.path.realpath(
+                                    os.path.join(os.getcwd(), os.path.dirname(__file__))))
+
+        # Opt-in timing of the hot paths, see tracing.py
+        self.tracer = get_tracer(kwargs.get("trace", None))
+
+        # Opt-in record of every completed session, see sessionlog.py
+        self.session_log = get_session_log(kwargs.get("session_log", None))
+
+        # Opt-in running answer/result counters, see analytics.py
+        self.analytics = get_analytics(kwargs.get("analytics", None))
+        self.session = None
+
+        with self.tracer.span("config_load"):
+            self.load_config(quiz_config)
+        self.reset()
+
+    def load_config(self, quiz_config):
+        """
+        Read in the quiz config and precompute everything that doesn't change between sessions
+        """
+        self.compiled = None
+        self.config_file = None
+
+        # Streaming only keeps the questions a session is going to ask
+        self.stream = self.kwargs.get("stream", False)
+        self.fresh_sample = False
+
+        if isinstance(quiz_config, dict): # If handed a dict read it directly
+            self.config = quiz_config
+
+        elif isinstance(quiz_config, CompiledQuiz): # Already opened compiled quiz
+            self.compiled = quiz_config
+
+        else: # else I'm assuming you're handing me a filepath and I'll try to read it
+            self.config_file = Path(quiz_config)
+
+            if not self.config_file.is_absolute():
+                self.config_file = self.working_dir / self.config_file
+
+            if self.config_file.suffix == ".qzb": # Compiled quiz, map it rather than parse it
+                self.compiled = CompiledQuiz(self.config_file)
+            elif self.stream:
+                self.config = self.sample_questions()
+            else:
+                with open(self.config_file) as ff:
+                    self.config = json.load(ff)
+
+        if self.compiled is not None:
+            self.config = self.compiled.config
+
+        self.set_config_info(self.config)
+
+        if self.stream:
+            if not self.fresh_sample:
+                self.sample_questions()
+        elif self.compiled is not None: # Everything is precomputed in the file
+            self.questions = self.compiled.questions
+            self.n_ans = self.compiled.n_ans
+            self.max_ans = self.compiled.max_ans
+            self.n_bits = self.compiled.n_bits
+            self.set_scoring(self.compiled.scores)
+            self.set_bank(np.arange(len(self.questions)), self.compiled.n_qs)
+        else:
+            self.set_questions(self.config.get("Questions", []))
+            self.set_bank(np.arange(len(self.questions)), len(self.questions))
+
+        # Get weightings of all possible options
+        if self.compiled is not None:
+            wgts = self.compiled.weights
+        else:
+            wgts = np.array([x["weight"] for x in self.results])
+        self.weights = wgts / np.sum(wgts) # normalize the array
+
+        # Build the result sampler once, every finish is then a constant time lookup
+        self.sampler = ResultSampler(self.weights)
+
+        # Small quizzes can have every outcome worked out ahead of time
+        self.outcome_table = None
+        if self.kwargs.get("precompute", False) and not self.stream:
+            try:
+                self.precompute_outcomes(self.kwargs.get("precompute_limit", DEFAULT_LIMIT))
+            except ValueError as e:
+                print(e)
+
+    def set_config_info(self, config):
+        """
+        Store key info from config, scoring needs the options and results before any questions are set
+        """
+        self.title = config.get("Quiz Name", "")
+        self.quiz_id = self.config_file.stem if self.config_file is not None else self.title
+        self.options = config.get("Options", {})
+        self.results = config.get("Results", {})
+        self.max_qs = self.kwargs.get("max_questions", self.options.get("Max Questions", np.inf))
+
+    def precompute_outcomes(self, limit=DEFAULT_LIMIT):
+        """
+        Load the stored answer -> result table, or build (and store) it if it's missing or stale
+        """
+        table = load_table(self) if self.config_file is not None else None
+        if table is None:
+            table = build_table(self, limit)
+            if self.config_file is not None:
+                save_table(self, table)
+
+        self.use_outcome_table(table)
+
+    def use_outcome_table(self, table):
+        self.outcome_table = table
+        self.outcome_strides = strides(self.n_ans)
+
+    def set_questions(self, questions, rows=None):
+        """
+        Store the questions a session asks and work out the answer bit widths.
+        rows are the answers' trait scores if they've already been pulled out of the questions.
+        """
+        # Figure out the largest number of answers for any question
+        self.n_ans = np.array([len(q["answers"]) for q in questions])
+        self.max_ans = max(self.n_ans)
+        self.n_bits = int(np.ceil(np.log2(self.max_ans)))
+
+        # Answers carrying trait scores are dicts, everything past here only wants their text
+        if rows is None and has_scores(questions):
+            rows = score_rows(questions, self.results)
+        if any(not isinstance(ans, str) for q in questions for ans in q["answers"]):
+            questions = plain_questions(questions)
+
+        self.questions = questions
+        self.set_scoring(rows)
+
+    def set_scoring(self, rows):
+        """
+        Pick how results are chosen, trait scoring if the answers carry scores (see traits.py)
+        otherwise the weighted draw seeded by the answers. Options "Scoring" overrides.
+        """
+        self.score_rows = rows
+        self.scores = None
+        self.trait_scorer = None
+        self.early_finish = False
+
+        self.scoring = self.options.get("Scoring", "traits" if rows is not None else "random")
+        if self.scoring == "traits":
+            if rows is None:
+                print(f"Quiz '{self.title}' asks for trait scoring but no answer has scores, using random")
+                self.scoring = "random"
+                return
+
+            self.scores = score_matrix(rows, self.n_ans, self.max_ans)
+            self.trait_scorer = TraitScorer(self.scores, len(self.n_ans), self.max_ans)
+
+            # Q x max_ans x R view of the answer scores for deciding sessions early
+            width = int(self.max_ans) + 1
+            self.answer_scores = self.scores.reshape(len(self.n_ans), width, -1)[:, 1:, :]
+            self.answer_valid = np.arange(self.max_ans) < np.asarray(self.n_ans)[:, np.newaxis]
+
+            # Stop asking once the result can't change, "Early Finish": false in Options to always ask everything
+            self.early_finish = self.kwargs.get("early_finish", self.options.get("Early Finish", True))
+
+    def set_bank(self, bank_idx, bank_size):
+        """
+        Record which questions of the bank are loaded and when to stop
+        """
+        self.bank_idx = bank_idx
+        self.bank_size = bank_size
+        self.n_qs = len(self.questions)
+
+        # Determine after how many questions to stop
+        if self.max_qs < self.n_qs : # Number has been limited in the config, stop at the defined limit
+            self.pbar_end = self.max_qs
+        else: # number of questions hasn't been limited, stop when you've run out of questions
+            self.pbar_end = self.n_qs
+
+        # Bit widths for packed sessions, answers need an extra code for "unanswered"
+        self.order_bits = max(int(self.n_qs - 1).bit_length(), 1)
+        self.code_bits = int(self.max_ans).bit_length()
+
+    def sample_indices(self, bank_size):
+        """
+        Sorted random draw of the bank indices a session will ask
+        """
+        if self.max_qs >= bank_size:
+            return np.arange(bank_size)
+        return np.sort(self.rng.choice(bank_size, int(self.max_qs), replace=False))
+
+    def sample_questions(self):
+        """
+        Draw the questions for the next session without materialising the rest of the bank.
+        Returns the config read along the way.
+        """
+        self.fresh_sample = True
+
+        if self.compiled is not None or self.config_file is None: # Already have random access to the bank
+            bank = self.compiled.questions if self.compiled is not None else self.config.get("Questions", [])
+            idx = self.sample_indices(len(bank))
+
+            rows = None
+            if self.compiled is not None and self.compiled.scores is not None:
+                rows = np.concatenate([self.compiled.question_scores(ii) for ii in idx])
+            self.set_questions([bank[ii] for ii in idx], rows)
+            self.set_bank(idx, len(bank))
+            return self.config
+
+        sample_size = self.kwargs.get("max_questions", None)
+        config, idx, questions, bank_size = stream_quiz(self.config_file, sample_size, self.rng)
+
+        # Max Questions wasn't known until after the questions were read, cut the sample down now
+        self.set_config_info(config)
+        if self.max_qs < len(questions):
+            keep = np.sort(self.rng.choice(len(questions), int(self.max_qs), replace=False))
+            idx = idx[keep]
+            questions = [questions[ii] for ii in keep]
+
+        self.set_questions(questions)
+        self.set_bank(idx, bank_size)
+
+        return config
+
+    def reset(self):
+        """
+        Start a fresh session: new question order and empty answers
+        """
+        # Starting over part way through counts as dropping out
+        if self.session is not None:
+            self.drop_session(self.session)
+
+        # Streaming sessions each get their own draw from the bank
+        if self.stream and not self.fresh_sample:
+            self.sample_questions()
+        self.fresh_sample = False
+
+        # Setup Question Order
+        q_order = np.arange(self.n_qs)
+        if self.options.get("Random Order", False):
+            self.rng.shuffle(q_order)
+
+        # Setup containers
+        self.session = QuizSession(self, q_order)
+        self.result_idx = None
+        self.result = None
+
+    def new_session(self, session_id=None, quiz=None):
+        """
+        Standalone session sharing this engine's questions, for servers and batch jobs
+        that hold many sessions at once. Starts on the first question.
+        """
+        q_order = np.arange(self.n_qs)
+        if self.options.get("Random Order", False):
+            self.rng.shuffle(q_order)
+        return QuizSession(self, q_order, session_id=session_id, quiz=quiz, cur_q_idx=0)
+
+    @property
+    def cur_q_idx(self):
+        return self.session.cur_q_idx
+
+    @property
+    def q_order(self):
+        return self.session.order_array()
+
+    @property
+    def answers(self):
+        return self.session.answers()
+
+    @answers.setter
+    def answers(self, answers):
+        self.session.set_answers(answers)
+
+    @property
+    def finished(self):
+        return self.session.finished
+
+    @property
+    def progress(self):
+        """
+        Percentage of the session completed
+        """
+        return self.session_progress(self.session)
+
+    def session_progress(self, session):
+        """
+        Percentage of a session completed, jumps to 100 if it finishes early
+        """
+        if session.finished:
+            return 100
+        return int(100 * max(session.cur_q_idx, 0) / self.pbar_end)
+
+    def current_question(self):
+        """
+        Return the question currently being asked, or None if there isn't one
+        """
+        if self.cur_q_idx < 0 or self.finished:
+            return None
+        return self.questions[self.session.question_index()]
+
+    def next_question(self):
+        """
+        Advance to the next question and return it, returns None once the session is over
+        """
+        self.advance_session(self.session)
+        return self.current_question()
+
+    def advance_session(self, session):
+        """
+        Move a session on to its next question, ending it early if the remaining questions
+        can't change the result. Returns the next question's bank index, None once it's over.
+        """
+        session.cur_q_idx += 1
+        if self.early_finish and 0 < session.cur_q_idx < session.end and self.decided(session):
+            session.end = session.cur_q_idx
+
+        if session.finished:
+            return None
+        return session.question_index()
+
+    def decided(self, session):
+        """
+        True if no way of answering the session's remaining questions can change its result.
+
+        For every other result r, the most r can gain on the leader L from question q is
+        max over answers of (score[a, r] - score[a, L]). If the leader's margin over r beats
+        the sum of those for every r (ties go to the earlier result, like argmax) it's decided.
+        """
+        totals = self.trait_scorer.totals(session.answers())[0]
+        leader = int(np.argmax(totals))
+
+        remaining = session.order_array()[session.cur_q_idx:session.end]
+        swing = self.answer_scores[remaining] - self.answer_scores[remaining][:, :, leader:leader + 1]
+        swing[~self.answer_valid[remaining]] = -np.inf
+        reach = swing.max(axis=1).sum(axis=0)
+
+        margin = totals[leader] - totals
+        ahead = np.where(np.arange(len(totals)) < leader, margin > reach, margin >= reach)
+        ahead[leader] = True
+        return bool(ahead.all())
+
+    def record_answer(self, value):
+        """
+        Save off the answer to the current question
+        """
+        self.session.record_answer(value)
+
+    def tabulate_score(self):
+        """
+        Take an array of scores and return a seed
+        """
+        with self.tracer.span("tabulate_score"):
+            return int(self.pack_seeds(self.answer_matrix())[0])
+
+    def answer_matrix(self):
+        """
+        The current session's answers as a 1 x Q int matrix, questions that were never
+        asked count as the first answer
+        """
+        return self.session.answer_matrix()
+
+    def pack_answers(self, answers):
+        """
+        Pack an N x Q answer matrix into N x W uint64 words, n_bits per answer.
+        Each word holds as many whole answers as fit, first question in the most significant bits.
+        Returns the words and the number of bits used in each word.
+        """
+        answers = np.asarray(answers, dtype=np.uint64)
+        n_rows, n_cols = answers.shape
+
+        per_word = 64 // self.n_bits if self.n_bits else max(n_cols, 1)
+        n_words = max(int(np.ceil(n_cols / per_word)), 1)
+
+        words = np.zeros((n_rows, n_words), dtype=np.uint64)
+        word_bits = np.zeros(n_words, dtype=np.int64)
+
+        for ww in range(n_words):
+            chunk = answers[:, ww*per_word:(ww+1)*per_word]
+            n_chunk = chunk.shape[1]
+
+            # Shift every answer into its slot and OR the slots together
+            shifts = (self.n_bits * np.arange(n_chunk - 1, -1, -1)).astype(np.uint64)
+            words[:, ww] = np.bitwise_or.reduce(chunk << shifts, axis=1)
+            word_bits[ww] = self.n_bits * n_chunk
+
+        return words, word_bits
+
+    def pack_seeds(self, answers):
+        """
+        Turn an N x Q answer matrix into N seeds, identical to concatenating each answer's bit string.
+        Seeds are uint64 when they fit, otherwise an object array of python ints.
+        """
+        return self.join_words(*self.pack_answers(answers))
+
+    def join_words(self, words, word_bits):
+        """
+        Stitch packed words back into one seed per row
+        """
+        if words.shape[1] == 1:
+            return words[:, 0]
+
+        # Too wide for a single word, stitch the words together as python ints
+        seeds = words[:, 0].astype(object)
+        for ww in range(1, words.shape[1]):
+            seeds = (seeds << int(word_bits[ww])) | words[:, ww].astype(object)
+
+        return seeds
+
+    def select_result(self, answers):
+        """
+        Pick a result index for a 1 x Q answer matrix based on a stable hash of the answers and the result weights
+        """
+        with self.tracer.span("select_result"):
+            return int(self.select_results(answers)[0])
+
+    def select_results(self, answers):
+        """
+        Batch version of select_result, one result index per row of answers.
+        Negative answers are unanswered, which only trait scoring tells apart from the first answer.
+        """
+        answers = np.asarray(answers, dtype=np.int64)
+
+        if self.outcome_table is not None and (self.trait_scorer is None or answers.min(initial=0) >= 0):
+            # Everything's been worked out already
+            return self.outcome_table[np.maximum(answers, 0) @ self.outcome_strides]
+
+        if self.trait_scorer is not None:
+            return self.trait_scorer.select(answers)
+
+        words, word_bits = self.pack_answers(np.maximum(answers, 0))
+        return self.sampler.sample_keys(words)
+
+    def score_batch(self, answers):
+        """
+        Score many sessions at once from an N x Q answer matrix (columns in question order,
+        not asked order). Returns N seeds and N result indices.
+        """
+        words, word_bits = self.pack_answers(answers)
+        seeds = self.join_words(words, word_bits)
+
+        if self.outcome_table is not None or self.trait_scorer is not None:
+            return seeds, self.select_results(answers)
+        return seeds, self.sampler.sample_keys(words)
+
+    def complete_session(self, session):
+        """
+        Score a finished session and store its result index. The first time a session
+        is completed it also goes to the session log and analytics, if there are any.
+        """
+        first = session.result_idx is None
+        session.result_idx = self.select_result(session.answers()[np.newaxis])
+
+        if first and (self.session_log is not None or self.analytics is not None):
+            # Both keyed by bank index, a streamed session's own question numbers mean nothing elsewhere
+            questions, codes = session.asked()
+            questions = self.bank_idx[questions]
+
+            if self.session_log is not None:
+                self.session_log.record(session.quiz or self.quiz_id, questions, codes, session.result_idx,
+                                        session.started)
+            if self.analytics is not None:
+                self.analytics.session_completed(session.quiz or self.quiz_id, self, questions, codes,
+                                                 session.result_idx)
+
+        return session.result_idx
+
+    def drop_session(self, session):
+        """
+        Note a session being abandoned, does nothing for finished or never started ones
+        """
+        if self.analytics is not None and session.result_idx is None and session.cur_q_idx >= 0:
+            self.analytics.session_dropped(session.quiz or self.quiz_id, self, int(session.cur_q_idx))
+
+    def finalize(self):
+        """
+        Score the session and return the chosen result
+        """
+        self.result_idx = self.complete_session(self.session)
+        self.result = self.results[self.result_idx]
+
+        return self.result
@@ -0,0 +1,352 @@
+import os
+from pathlib import Path
+import io
+import json
+import time
+import atexit
+import hashlib
+import threading
+
+# requests and PIL are imported where they are used, so nothing heavy loads until an image
+# is actually fetched (normally on an image worker thread)
+
+from tracing import NULL_TRACER
+
+
+def default_max_image_bytes():
+    """
+    Largest image body we'll download, QUIZZER_MAX_IMAGE_MB (20MB) by default
+    """
+    return int(float(os.environ.get("QUIZZER_MAX_IMAGE_MB", 20)) * 1024 * 1024)
+
+
+def read_capped(resp, max_bytes=None, url=""):
+    """
+    Read a streamed response body, giving up as soon as it passes max_bytes
+    """
+    if max_bytes is None:
+        max_bytes = default_max_image_bytes()
+
+    length = resp.headers.get("Content-Length", "")
+    if length.isdigit() and int(length) > max_bytes:
+        raise ValueError(f"Image '{url}' is {int(length)} bytes, over the {max_bytes} byte limit")
+
+    chunks = []
+    total = 0
+    for chunk in resp.iter_content(64*1024):
+        total += len(chunk)
+        if total > max_bytes:
+            raise ValueError(f"Image '{url}' is over the {max_bytes} byte limit")
+        chunks.append(chunk)
+
+    return b"".join(chunks)
+
+
+def scale_image(data, height):
+    """
+    Decode image bytes and rescale to the given height. JPEGs are decoded at a reduced
+    scale (libjpeg can do 1/2, 1/4 or 1/8 for nearly free) so a big portrait never gets
+    decoded at full resolution just to be thrown away.
+    """
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    scale = height / img.height
+    new_size = (max(int(img.width*scale), 1), height)
+
+    # Only ever shrinks, picks the smallest scale that's still at least new_size
+    img.draft("RGB", new_size)
+    img.load()
+
+    # reducing_gap box-reduces most of the way first, then resamples the rest properly
+    return img.resize(new_size, Image.BICUBIC, reducing_gap=2.0)
+
+
+class ImageCache(object):
+    """
+    Persistent, content addressed cache for result images.
+
+    Blobs are stored under their sha256 so identical images are only kept once. The
+    index maps each url to its original blob, its validators (ETag / Last-Modified)
+    and any rescaled versions. Total blob size is capped and the least recently
+    used blobs are evicted first. If the network is unavailable whatever is on disk
+    is served as-is.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, revalidate_after=24*60*60, timeout=10, session=None,
+                 max_image_bytes=None, **kwargs):
+        self.kwargs = kwargs
+
+        if cache_dir is None:
+            cache_dir = os.environ.get("QUIZZER_CACHE_DIR", Path.home() / ".quizzer" / "image_cache")
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("QUIZZER_CACHE_MB", 256)) * 1024 * 1024)
+
+        self.cache_dir = Path(cache_dir)
+        self.blob_dir = self.cache_dir / "blobs"
+        self.index_file = self.cache_dir / "index.json"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+        self.max_bytes = max_bytes
+        self.max_image_bytes = max_image_bytes if max_image_bytes is not None else default_max_image_bytes()
+        self.revalidate_after = revalidate_after
+        self.timeout = timeout
+
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.shared_session = session
+        self.index = self.load_index()
+
+        # Hits only bump access times, those are written out with the next new blob or at exit
+        self.dirty = False
+        atexit.register(self.flush)
+
+    # Index ----------------------------------------------------------------
+
+    def load_index(self):
+        try:
+            with open(self.index_file) as ff:
+                index = json.load(ff)
+        except (OSError, ValueError):
+            index = {}
+
+        index.setdefault("urls", {})
+        index.setdefault("blobs", {})
+
+        # Drop anything whose blob has gone missing
+        for digest in list(index["blobs"]):
+            if not self.blob_path(digest).exists():
+                del index["blobs"][digest]
+
+        return index
+
+    def save_index(self):
+        tmp = self.index_file.with_suffix(".tmp")
+        with open(tmp, "w") as ff:
+            json.dump(self.index, ff)
+        os.replace(tmp, self.index_file)
+        self.dirty = False
+
+    def flush(self):
+        """
+        Write the index out if anything has changed since it was last saved
+        """
+        with self.lock:
+            if self.dirty:
+                try:
+                    self.save_index()
+                except OSError as e:
+                    print(f"Unable to save image cache index: {e}")
+
+    @property
+    def total_bytes(self):
+        return sum(x["size"] for x in self.index["blobs"].values())
+
+    # Blobs ----------------------------------------------------------------
+
+    def blob_path(self, digest):
+        return self.blob_dir / digest[:2] / digest
+
+    def read_blob(self, digest):
+        """
+        Return the bytes for a blob and mark it as recently used, None if it isn't cached
+        """
+        if digest is None or digest not in self.index["blobs"]:
+            return None
+
+        try:
+            data = self.blob_path(digest).read_bytes()
+        except OSError:
+            del self.index["blobs"][digest]
+            self.dirty = True
+            return None
+
+        self.index["blobs"][digest]["atime"] = time.time()
+        self.dirty = True
+        return data
+
+    def write_blob(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+
+        path = self.blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+        self.index["blobs"][digest] = {"size": len(data), "atime": time.time()}
+        return digest
+
+    def evict(self, keep=()):
+        """
+        Drop least recently used blobs until the cache is back under its byte cap
+        """
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+
+        by_age = sorted(self.index["blobs"].items(), key=lambda x: x[1]["atime"])
+        for digest, info in by_age:
+            if total <= self.max_bytes:
+                break
+            if digest in keep:
+                continue
+
+            try:
+                self.blob_path(digest).unlink()
+            except OSError:
+                pass
+
+            del self.index["blobs"][digest]
+            total -= info["size"]
+
+        # Forget url entries that point at evicted blobs
+        for url, entry in list(self.index["urls"].items()):
+            entry["scaled"] = {k: v for k, v in entry.get("scaled", {}).items() if v in self.index["blobs"]}
+            if entry.get("hash") not in self.index["blobs"]:
+                del self.index["urls"][url]
+
+    # Network --------------------------------------------------------------
+
+    @property
+    def session(self):
+        if self.shared_session is not None:
+            return self.shared_session
+
+        # Otherwise give each worker thread its own session
+        if not hasattr(self.local, "session"):
+            import requests
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def download(self, url, entry):
+        """
+        Fetch the url, sending validators if we already have a copy.
+        Returns (status, data, headers)
+        """
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        # Streamed so an oversized image is dropped without ever being held in memory
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as resp:
+            if resp.status_code == 304:
+                return 304, None, resp.headers
+
+            resp.raise_for_status()
+            return resp.status_code, read_capped(resp, self.max_image_bytes, url), resp.headers
+
+    # Public API -----------------------------------------------------------
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get("checked", 0) < self.revalidate_after
+
+    def get_original(self, url):
+        """
+        Return the original bytes for url, from disk when they're still fresh
+        """
+        import requests
+
+        with self.lock:
+            entry = self.index["urls"].get(url, None)
+            data = self.read_blob(entry["hash"]) if entry else None
+
+            if data is not None and self.is_fresh(entry):
+                return data
+
+        try:
+            status, new_data, headers = self.download(url, entry if data is not None else None)
+        except requests.RequestException:
+            if data is not None: # Offline, serve what we've got
+                return data
+            raise
+
+        with self.lock:
+            if status == 304:
+                entry["checked"] = time.time()
+                self.dirty = True
+                return data
+
+            digest = self.write_blob(new_data)
+            old = self.index["urls"].get(url, {})
+            self.index["urls"][url] = {
+                "hash": digest,
+                "etag": headers.get("ETag", None),
+                "last_modified": headers.get("Last-Modified", None),
+                "checked": time.time(),
+                # Rescaled versions are only valid for the content they came from
+                "scaled": old.get("scaled", {}) if old.get("hash") == digest else {},
+            }
+
+            self.evict(keep=(digest,))
+            self.save_index()
+
+        return new_data
+
+    def get_scaled(self, url, height=480, tracer=NULL_TRACER):
+        """
+        Return PNG bytes of the image at url rescaled to the given height
+        """
+        # A fresh rescaled copy is all we need, the original only gets read to build one
+        with self.lock:
+            entry = self.index["urls"].get(url, None)
+            if entry is not None and self.is_fresh(entry):
+                data = self.read_blob(entry.get("scaled", {}).get(str(height), None))
+                if data is not None:
+                    return data
+
+        with tracer.span("image_fetch", url=url):
+            original = self.get_original(url)
+
+        return self.scale_original(url, original, height, tracer)
+
+    def scale_original(self, url, original, height=480, tracer=NULL_TRACER):
+        """
+        Rescaled PNG bytes for original, the bytes just fetched by get_original(url), built
+        and stored unless there's already a copy for this content
+        """
+        # Revalidating may have found the content unchanged, in which case the old copy still holds
+        with self.lock:
+            entry = self.index["urls"].get(url, {})
+            data = self.read_blob(entry.get("scaled", {}).get(str(height), None))
+            if data is not None:
+                return data
+
+        with tracer.span("image_decode", url=url):
+            img = scale_image(original, height)
+
+        with tracer.span("image_encode", url=url):
+            if img.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+                img = img.convert("RGBA")
+
+            # Small and read back often, so favour a fast encode over the last few bytes
+            buf = io.BytesIO()
+            img.save(buf, format="PNG", compress_level=1)
+            data = buf.getvalue()
+
+        with self.lock:
+            digest = self.write_blob(data)
+            if url in self.index["urls"]:
+                self.index["urls"][url].setdefault("scaled", {})[str(height)] = digest
+
+            self.evict(keep=(digest, entry.get("hash")))
+            self.save_index()
+
+        return data
+
+
+default_cache = None
+
+
+def get_default_cache():
+    """
+    Process wide cache shared by every quiz
+    """
+    global default_cache
+    if default_cache is None:
+        default_cache = ImageCache()
+    return default_cache
@@ -0,0 +1,174 @@
+import os
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QBuffer, QIODevice, QSize, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap, QPixmapCache
+
+from imagecache import read_capped
+from tracing import NULL_TRACER
+from workers import safe_emit
+
+
+def load_img_url(url, max_bytes=None, timeout=10):
+    """
+    Download the raw bytes for an image, capped at max_bytes
+    """
+    # Deferred so the network stack loads on the worker that needs it, not at startup
+    import requests
+    with requests.get(url, stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        return read_capped(resp, max_bytes, url)
+
+
+def decode_scaled(data, height=480, url=""):
+    """
+    Decode image bytes straight into a QImage of the given height. The reader is told
+    the final size up front, so JPEGs are decoded by libjpeg at a reduced scale instead
+    of at full size and shrunk afterwards, and there's no intermediate PIL image to copy.
+    """
+    buf = QBuffer()
+    buf.setData(data)
+    buf.open(QIODevice.ReadOnly)
+
+    reader = QImageReader(buf)
+    size = reader.size()
+    if size.isValid() and size.height() > 0:
+        reader.setScaledSize(QSize(max(int(size.width() * height / size.height()), 1), height))
+    # Anything over 50 gets a smooth rather than nearest neighbour final scale
+    reader.setQuality(75)
+
+    img = reader.read()
+    if img.isNull():
+        raise ValueError(f"Unable to decode image '{url}': {reader.errorString()}")
+    return img
+
+
+def fetch_image(url, height=480, cache=None, tracer=NULL_TRACER):
+    """
+    Download, decode and rescale an image. Safe to call off the GUI thread, returns a QImage
+    """
+    if cache is not None:
+        data = cache.get_scaled(url, height, tracer=tracer)
+        with tracer.span("image_convert", url=url):
+            img = QImage.fromData(data)
+        if img.isNull():
+            raise ValueError(f"Unable to decode image '{url}'")
+        return img
+
+    with tracer.span("image_fetch", url=url):
+        data = load_img_url(url)
+
+    with tracer.span("image_decode", url=url):
+        return decode_scaled(data, height, url)
+
+
+class ImageSignals(QObject):
+    done = pyqtSignal(str, QImage)
+    failed = pyqtSignal(str, str)
+
+
+class ImageTask(QRunnable):
+    """
+    Fetch a single image on the thread pool and report back through the loader's signals
+    """
+
+    def __init__(self, url, height, signals, cache=None, tracer=NULL_TRACER):
+        super(ImageTask, self).__init__()
+        self.url = url
+        self.height = height
+        self.signals = signals
+        self.cache = cache
+        self.tracer = tracer
+
+    def run(self):
+        try:
+            img = fetch_image(self.url, self.height, self.cache, self.tracer)
+        except Exception as e:
+            safe_emit(self.signals, "failed", self.url, str(e))
+            return
+
+        safe_emit(self.signals, "done", self.url, img)
+
+
+pixmap_cache_limit_set = False
+
+
+def set_pixmap_cache_limit(mb=None):
+    """
+    Bound the process wide QPixmapCache, defaults to QUIZZER_PIXMAP_CACHE_MB (64MB)
+    """
+    global pixmap_cache_limit_set
+    if mb is None:
+        mb = float(os.environ.get("QUIZZER_PIXMAP_CACHE_MB", 64))
+    QPixmapCache.setCacheLimit(int(mb * 1024))
+    pixmap_cache_limit_set = True
+
+
+class ImageLoader(QObject):
+    """
+    Loads result images on a QThreadPool so the GUI never blocks on the network.
+    Finished images are converted once and kept as ready to display pixmaps in the
+    process wide QPixmapCache, so every quiz and every retry after that skips the
+    whole decode/convert pipeline.
+    """
+    loaded = pyqtSignal(str, QPixmap)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, height=480, pool=None, cache=None, tracer=NULL_TRACER, **kwargs):
+        super(ImageLoader, self).__init__()
+        self.kwargs = kwargs
+
+        # The pixmap cache is process wide, only fall back on the default if nobody has set it yet
+        if not pixmap_cache_limit_set:
+            set_pixmap_cache_limit()
+
+        self.height = height
+        self.cache = cache
+        self.tracer = tracer
+        self.pool = pool if pool is not None else QThreadPool.globalInstance()
+
+        self.pending = set()
+
+        # Workers emit on these, Qt queues the calls back onto the GUI thread
+        self.signals = ImageSignals()
+        self.signals.done.connect(self.on_done)
+        self.signals.failed.connect(self.on_failed)
+
+    def pixmap_key(self, url):
+        return f"{self.height}@{url}"
+
+    def find(self, url):
+        """
+        Return the ready to display pixmap for url, None if it hasn't been loaded
+        """
+        return QPixmapCache.find(self.pixmap_key(url))
+
+    def prefetch(self, urls):
+        """
+        Start loading every url in the background without waiting on any of them
+        """
+        for url in urls:
+            if url and url not in self.pending and self.find(url) is None:
+                self.pending.add(url)
+                self.pool.start(ImageTask(url, self.height, self.signals, self.cache, self.tracer))
+
+    def request(self, url):
+        """
+        Ask for an image, loaded is emitted straight away if it's already here
+        """
+        pix = self.find(url)
+        if pix is not None:
+            self.loaded.emit(url, pix)
+        else:
+            self.prefetch([url])
+
+    def on_done(self, url, img):
+        self.pending.discard(url)
+
+        # QPixmaps can only be made on the GUI thread, which is where this runs
+        pix = QPixmap.fromImage(img)
+        QPixmapCache.insert(self.pixmap_key(url), pix)
+        self.loaded.emit(url, pix)
+
+    def on_failed(self, url, msg):
+        self.pending.discard(url)
+        self.failed.emit(url, msg)
@@ -0,0 +1,145 @@
+"""
+Exhaustive answer -> result lookup tables.
+
+    python outcomes.py quiz.json [--csv quiz_outcomes.csv]
+
+For quizzes whose answer space (the product of every question's answer count) is
+small enough, every possible answer vector is scored once with the batch engine
+and the result indices are stored next to the quiz as <quiz>.outcomes.npz.
+Finishing a session is then a single array lookup, and the exported table lets
+the mapping be checked without running the scoring at all.
+"""
+import sys
+from pathlib import Path
+import csv
+import argparse
+
+import numpy as np
+
+
+DEFAULT_LIMIT = 2**24
+
+
+def space_size(n_ans):
+    """
+    Number of distinct answer vectors, as a python int so it can't overflow
+    """
+    size = 1
+    for n in n_ans:
+        size *= int(n)
+    return size
+
+
+def strides(n_ans):
+    """
+    Mixed radix place values, the last question changes fastest
+    """
+    out = np.ones(len(n_ans), dtype=np.int64)
+    for ii in range(len(n_ans) - 2, -1, -1):
+        out[ii] = out[ii + 1] * int(n_ans[ii + 1])
+    return out
+
+
+def enumerate_answers(n_ans, start, stop):
+    """
+    Answer matrix for table rows [start, stop)
+    """
+    idx = np.arange(start, stop, dtype=np.int64)
+    n_ans = np.asarray(n_ans, dtype=np.int64)
+    return (idx[:, np.newaxis] // strides(n_ans)) % n_ans
+
+
+def build_table(engine, limit=DEFAULT_LIMIT, chunk=1 << 16):
+    """
+    Score every possible answer vector, returns the result index for each table row
+    """
+    size = space_size(engine.n_ans)
+    if size > limit:
+        raise ValueError(f"Answer space has {size} entries, more than the limit of {limit}")
+
+    dtype = np.min_scalar_type(max(len(engine.results) - 1, 0))
+    table = np.empty(size, dtype=dtype)
+
+    for start in range(0, size, chunk):
+        stop = min(start + chunk, size)
+        table[start:stop] = engine.select_results(enumerate_answers(engine.n_ans, start, stop))
+
+    return table
+
+
+def trait_scores(engine):
+    """
+    The engine's trait score matrix, empty when results are drawn at random
+    """
+    return engine.scores if engine.scores is not None else np.zeros(0)
+
+
+def table_path(quiz_file):
+    quiz_file = Path(quiz_file)
+    return quiz_file.with_name(quiz_file.stem + ".outcomes.npz")
+
+
+def save_table(engine, table, path=None):
+    """
+    Store the table with what it was built from, so a stale table can be spotted
+    """
+    path = table_path(engine.config_file) if path is None else Path(path)
+    with open(path, "wb") as ff:
+        np.savez(ff, table=table, n_ans=engine.n_ans, weights=engine.weights, scores=trait_scores(engine))
+    return path
+
+
+def load_table(engine, path=None):
+    """
+    Load a stored table, None if there isn't one or it no longer matches the quiz
+    """
+    path = table_path(engine.config_file) if path is None else Path(path)
+    try:
+        with np.load(path) as data:
+            if not np.array_equal(data["n_ans"], engine.n_ans) or not np.array_equal(data["weights"], engine.weights):
+                return None
+            if not np.array_equal(data["scores"], trait_scores(engine)):
+                return None
+            return data["table"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def export_csv(engine, table, path, chunk=1 << 16):
+    """
+    Write every answer vector and its result out as CSV
+    """
+    with open(path, "w", newline="") as ff:
+        writer = csv.writer(ff)
+        writer.writerow([f"q{ii}" for ii in range(engine.n_qs)] + ["result", "name"])
+
+        for start in range(0, len(table), chunk):
+            stop = min(start + chunk, len(table))
+            answers = enumerate_answers(engine.n_ans, start, stop)
+            for row, res in zip(answers, table[start:stop]):
+                writer.writerow(list(row) + [int(res), engine.results[res]["Name"]])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the answer -> result table for a quiz")
+    parser.add_argument("quiz", type=Path, help="quiz json file")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="largest answer space to enumerate")
+    parser.add_argument("--csv", type=Path, default=None, help="also export the table as CSV")
+    args = parser.parse_args(argv)
+
+    from engine import QuizEngine
+    engine = QuizEngine(args.quiz.resolve())
+    print(f"{engine.title}: {space_size(engine.n_ans)} possible answer vectors")
+
+    table = build_table(engine, limit=args.limit)
+    print(f"table written to {save_table(engine, table)}")
+
+    if args.csv is not None:
+        export_csv(engine, table, args.csv)
+        print(f"exported to {args.csv}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Download, validate and pre-resize every result image for one or more quizzes.
+
+    python prefetch.py whatjediareyou.json other_quiz.json --workers 16
+
+Images go into the same on-disk cache QuickQuiz reads from, so a warmed machine
+shows results without touching the network. A JSON manifest of what was fetched
+is written to the cache directory, and failures are reported at the end.
+"""
+import sys
+from pathlib import Path
+import io
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+
+from imagecache import ImageCache
+
+
+def make_session(workers):
+    """
+    One pooled session for every worker, sized so no worker waits on a connection
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def collect_images(quiz_files):
+    """
+    Map each image url to the (quiz, result name) pairs that use it
+    """
+    images = {}
+    for quiz_file in quiz_files:
+        with open(quiz_file) as ff:
+            config = json.load(ff)
+
+        for result in config.get("Results", []):
+            url = result.get("image", None)
+            if url:
+                images.setdefault(url, []).append((str(quiz_file), result.get("Name", "")))
+
+    return images
+
+
+def warm_image(cache, url, height):
+    """
+    Fetch one image through the cache, make sure it decodes and build the rescaled copy
+    """
+    start = time.perf_counter()
+    row = {"url": url, "ok": False}
+
+    try:
+        original = cache.get_original(url)
+        with Image.open(io.BytesIO(original)) as img:
+            row["width"], row["height"] = img.size
+            img.verify()
+
+        # Reuse the original we already have, get_scaled would revalidate it all over again
+        scaled = cache.scale_original(url, original, height)
+
+        row["bytes"] = len(original)
+        row["scaled_bytes"] = len(scaled)
+        row["hash"] = cache.index["urls"][url]["hash"]
+        row["ok"] = True
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+
+def prefetch(quiz_files, workers=8, height=480, cache=None, timeout=10):
+    """
+    Warm the image cache for every quiz file, returns the manifest dict
+    """
+    if cache is None:
+        cache = ImageCache(session=make_session(workers), timeout=timeout, revalidate_after=0)
+
+    images = collect_images(quiz_files)
+
+    start = time.perf_counter()
+    rows = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(warm_image, cache, url, height): url for url in images}
+        for fut in as_completed(futures):
+            row = fut.result()
+            row["used_by"] = [{"quiz": quiz, "result": name} for quiz, name in images[row["url"]]]
+            rows.append(row)
+
+    manifest = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "quizzes": [str(x) for x in quiz_files],
+        "height": height,
+        "workers": workers,
+        "cache_dir": str(cache.cache_dir),
+        "seconds": time.perf_counter() - start,
+        "n_images": len(rows),
+        "n_failed": sum(not x["ok"] for x in rows),
+        "images": sorted(rows, key=lambda x: x["url"]),
+    }
+
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download, validate and pre-resize quiz result images")
+    parser.add_argument("quizzes", nargs="+", type=Path, help="quiz json files")
+    parser.add_argument("--workers", type=int, default=8, help="number of parallel downloads")
+    parser.add_argument("--height", type=int, default=480, help="height results are displayed at")
+    parser.add_argument("--timeout", type=float, default=10, help="per request timeout in seconds")
+    parser.add_argument("--cache-dir", default=None, help="image cache directory")
+    parser.add_argument("--cache-mb", type=float, default=None, help="image cache size cap")
+    parser.add_argument("--max-image-mb", type=float, default=None, help="skip images bigger than this")
+    parser.add_argument("--manifest", type=Path, default=None,
+                        help="where to write the manifest, defaults to image_manifest.json in the cache directory")
+    args = parser.parse_args(argv)
+
+    cache = ImageCache(
+        cache_dir=args.cache_dir,
+        max_bytes=None if args.cache_mb is None else int(args.cache_mb * 1024 * 1024),
+        max_image_bytes=None if args.max_image_mb is None else int(args.max_image_mb * 1024 * 1024),
+        revalidate_after=0,
+        timeout=args.timeout,
+        session=make_session(args.workers),
+    )
+
+    manifest = prefetch(args.quizzes, workers=args.workers, height=args.height, cache=cache)
+
+    # Not the current directory, run from the quiz directory it would show up as a broken quiz
+    if args.manifest is None:
+        args.manifest = cache.cache_dir / "image_manifest.json"
+
+    with open(args.manifest, "w") as ff:
+        json.dump(manifest, ff, indent=4)
+
+    # Report ---------------------------------------------------------------
+    times = sorted(x["seconds"] for x in manifest["images"])
+    for row in manifest["images"]:
+        if not row["ok"]:
+            users = ", ".join(x["result"] for x in row["used_by"])
+            print(f"FAILED {users}: {row['url']}")
+            print(f"    {row['error']}")
+
+    print(f"{manifest['n_images'] - manifest['n_failed']}/{manifest['n_images']} images ok "
+          f"in {manifest['seconds']:.2f}s with {args.workers} workers")
+    if times:
+        print(f"per image: median {times[len(times)//2]:.3f}s, slowest {times[-1]:.3f}s")
+    print(f"manifest written to {args.manifest}")
+
+    return 1 if manifest["n_failed"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
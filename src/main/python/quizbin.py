@@ -0,0 +1,218 @@
+"""
+Compiled binary quiz format.
+
+    python quizbin.py whatjediareyou.json      # writes whatjediareyou.qzb
+
+Layout (little endian), every section 8 byte aligned:
+
+    header      magic, version, counts, max_ans, n_bits and the (offset, length) of each section
+    meta        utf-8 JSON of everything except the questions (name, options, results, ...)
+    q_text      uint64[n_qs + 1]       offsets of each question's text in the string blob
+    n_ans       uint16[n_qs]           number of answers per question
+    ans_start   uint64[n_qs + 1]       index of each question's first answer
+    ans_text    uint64[total_ans + 1]  offsets of each answer's text in the string blob
+    weights     float64[n_results]     raw result weights
+    blob        utf-8 text of every question and answer, back to back
+    scores      float64[total_ans, n_results]  trait scores per answer, empty if the quiz has none
+
+CompiledQuiz opens the file with mmap and serves the tables as numpy views and the
+text as memoryview slices, so nothing is materialised until it's asked for.
+"""
+import sys
+from pathlib import Path
+import json
+import mmap
+import struct
+from collections.abc import Sequence
+
+import numpy as np
+
+from traits import answer_text, has_scores, score_rows
+
+
+MAGIC = b"QZB1"
+VERSION = 2
+SECTIONS = ("meta", "q_text", "n_ans", "ans_start", "ans_text", "weights", "blob", "scores")
+
+# magic, version, n_qs, n_results, total_ans, max_ans, n_bits, then (offset, length) per section
+HEADER = struct.Struct("<4sIIIQII" + "QQ" * len(SECTIONS))
+PREFIX = struct.Struct("<4sI")
+
+
+def align(n, to=8):
+    return (n + to - 1) // to * to
+
+
+def compile_quiz(config, out_path):
+    """
+    Write a quiz config (dict or path to a json file) out in the compiled format
+    """
+    if not isinstance(config, dict):
+        with open(config) as ff:
+            config = json.load(ff)
+
+    questions = config.get("Questions", [])
+    results = config.get("Results", [])
+    meta = {k: v for k, v in config.items() if k != "Questions"}
+
+    # Build the string blob and offset tables
+    blob = bytearray()
+    q_text = [0]
+    n_ans = []
+    ans_start = [0]
+
+    for q in questions:
+        blob += q["text"].encode("utf-8")
+        q_text.append(len(blob))
+
+        n_ans.append(len(q["answers"]))
+        ans_start.append(ans_start[-1] + len(q["answers"]))
+
+    # Answer text goes after all the question text
+    ans_text = [len(blob)]
+    for q in questions:
+        for ans in q["answers"]:
+            blob += answer_text(ans).encode("utf-8")
+            ans_text.append(len(blob))
+
+    max_ans = max(n_ans) if n_ans else 0
+    n_bits = int(np.ceil(np.log2(max_ans))) if max_ans else 0
+
+    sections = {
+        "meta": json.dumps(meta).encode("utf-8"),
+        "q_text": np.array(q_text, dtype="<u8").tobytes(),
+        "n_ans": np.array(n_ans, dtype="<u2").tobytes(),
+        "ans_start": np.array(ans_start, dtype="<u8").tobytes(),
+        "ans_text": np.array(ans_text, dtype="<u8").tobytes(),
+        "weights": np.array([x["weight"] for x in results], dtype="<f8").tobytes(),
+        "blob": bytes(blob),
+        "scores": score_rows(questions, results).astype("<f8").tobytes() if has_scores(questions) else b"",
+    }
+
+    # Lay the sections out after the header
+    table = []
+    offset = align(HEADER.size)
+    for name in SECTIONS:
+        table += [offset, len(sections[name])]
+        offset = align(offset + len(sections[name]))
+
+    header = HEADER.pack(MAGIC, VERSION, len(questions), len(results), ans_start[-1], max_ans, n_bits, *table)
+
+    with open(out_path, "wb") as ff:
+        ff.write(header)
+        for ii, name in enumerate(SECTIONS):
+            ff.seek(table[2*ii])
+            ff.write(sections[name])
+
+        # Pad the tail so the last section is aligned too
+        ff.truncate(offset)
+
+    return Path(out_path)
+
+
+class QuestionTable(Sequence):
+    """
+    Read only list of questions backed by the mapped file.
+    Indexing builds the {"text", "answers"} dict for that one question only.
+    """
+
+    def __init__(self, quiz):
+        self.quiz = quiz
+
+    def __len__(self):
+        return self.quiz.n_qs
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[ii] for ii in range(*idx.indices(len(self)))]
+
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("question index out of range")
+
+        return {
+            "text": self.quiz.question_text(idx),
+            "answers": [self.quiz.answer_text(idx, jj) for jj in range(self.quiz.n_ans[idx])],
+        }
+
+
+class CompiledQuiz(object):
+    """
+    A compiled quiz opened with mmap. Tables are zero-copy numpy views into the file and
+    the raw_* methods hand back memoryview slices of the text without copying.
+    """
+
+    def __init__(self, path, **kwargs):
+        self.kwargs = kwargs
+        self.path = Path(path)
+
+        self.file = open(self.path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self.map)
+
+        magic, version = PREFIX.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"'{self.path}' is not a compiled quiz (version {VERSION})")
+
+        fields = HEADER.unpack_from(self.buf, 0)
+        self.n_qs, self.n_results, self.total_ans, self.max_ans, self.n_bits = fields[2:7]
+
+        self.sections = {name: (fields[7 + 2*ii], fields[8 + 2*ii]) for ii, name in enumerate(SECTIONS)}
+
+        self.config = json.loads(bytes(self.section("meta")).decode("utf-8"))
+        self.q_text = np.frombuffer(self.section("q_text"), dtype="<u8")
+        self.n_ans = np.frombuffer(self.section("n_ans"), dtype="<u2")
+        self.ans_start = np.frombuffer(self.section("ans_start"), dtype="<u8")
+        self.ans_text = np.frombuffer(self.section("ans_text"), dtype="<u8")
+        self.weights = np.frombuffer(self.section("weights"), dtype="<f8")
+        self.blob = self.section("blob")
+
+        self.scores = None
+        if self.sections["scores"][1]:
+            self.scores = np.frombuffer(self.section("scores"), dtype="<f8").reshape(self.total_ans, self.n_results)
+
+        self.questions = QuestionTable(self)
+        self.results = self.config.get("Results", [])
+
+    def section(self, name):
+        offset, length = self.sections[name]
+        return self.buf[offset:offset + length]
+
+    def raw_question_text(self, idx):
+        return self.blob[self.q_text[idx]:self.q_text[idx + 1]]
+
+    def raw_answer_text(self, idx, ans):
+        kk = self.ans_start[idx] + ans
+        return self.blob[self.ans_text[kk]:self.ans_text[kk + 1]]
+
+    def question_scores(self, idx):
+        """
+        Trait score rows of one question's answers
+        """
+        return self.scores[self.ans_start[idx]:self.ans_start[idx + 1]]
+
+    def question_text(self, idx):
+        return str(self.raw_question_text(idx), "utf-8")
+
+    def answer_text(self, idx, ans):
+        return str(self.raw_answer_text(idx, ans), "utf-8")
+
+    def close(self):
+        """
+        Unmap the file. Anything still holding one of the tables (an engine's n_ans for
+        example) keeps the map alive, so drop those first.
+        """
+        # Views have to go before the map can be closed
+        self.q_text = self.n_ans = self.ans_start = self.ans_text = self.weights = self.scores = None
+        self.blob.release()
+        self.buf.release()
+        self.map.close()
+        self.file.close()
+
+
+if __name__ == '__main__':
+    for quiz_file in sys.argv[1:]:
+        out = compile_quiz(quiz_file, Path(quiz_file).with_suffix(".qzb"))
+        print(f"{quiz_file} -> {out}")
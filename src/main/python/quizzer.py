@@ -1,19 +1,16 @@
 import sys
-import os
-from pathlib import Path
-import json
-import numpy as np
+import time
 # import random
-import requests
 # from time import sleep
-from PIL import Image
-from PIL.ImageQt import ImageQt
+
+from engine import QuizEngine
+from imageloader import ImageLoader, set_pixmap_cache_limit
+from imagecache import get_default_cache
 
 # from fbs_runtime.application_context.PyQt5 import ApplicationContext
 from PyQt5.QtWidgets import QApplication, QWidget, QDialog, QFormLayout, QGridLayout, QLabel, QDoubleSpinBox, QFileDialog
 from PyQt5.QtWidgets import  QCheckBox, QPushButton, QHBoxLayout, QVBoxLayout, QScrollArea, QLineEdit, QComboBox, QProgressBar
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QPixmap
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer
 
 
 class QuickQuestion(QDialog):
@@ -34,13 +31,42 @@ class QuickQuestion(QDialog):
 
         self.value = None
 
+        self.buttons = []
         for ii, row in enumerate(answers):
-            butt = QPushButton(row)
-            butt.id = ii            
-            
-            butt.clicked.connect(self.clickeroni)
+            self.add_button(row)
+
+        # Spare buttons so the view can be reused for questions with more answers
+        for ii in range(len(answers), kwargs.get("n_buttons", 0)):
+            self.add_button("").hide()
+
+    def add_button(self, text):
+        butt = QPushButton(text)
+        butt.id = len(self.buttons)
+
+        butt.clicked.connect(self.clickeroni)
+
+        self.lay.addWidget(butt)
+        self.buttons.append(butt)
+
+        return butt
+
+    def set_question(self, text="", answers=[]):
+        """
+        Reuse this view for another question, the label and buttons are updated in place
+        """
+        self.text.setText(text)
+        self.value = None
+
+        # Only grow the pool if a question has more answers than we've seen so far
+        for ii in range(len(self.buttons), len(answers)):
+            self.add_button("")
 
-            self.lay.addWidget(butt)
+        for ii, butt in enumerate(self.buttons):
+            if ii < len(answers):
+                butt.setText(answers[ii])
+                butt.show()
+            else:
+                butt.hide()
 
     def set_value(self, x):
         self.value = x
@@ -61,65 +87,66 @@ class QuickQuiz(QDialog):
         super(QuickQuiz, self).__init__()
         self.kwargs = kwargs
 
-        self.working_dir = Path(os.path.realpath(
-                                    os.path.join(os.getcwd(), os.path.dirname(__file__)))) 
+        # Decoded result images are shared between every quiz in the process, so only
+        # touch the limit if asked to, otherwise the image loader sets the default once
+        if kwargs.get("pixmap_cache_mb", None) is not None:
+            set_pixmap_cache_limit(kwargs["pixmap_cache_mb"])
 
-        # Read in config
-        if isinstance(quiz_config, dict): # If handed a dict read it directly
-            self.config = quiz_config
-
-        else: # else I'm assuming you're handing me a filepath and I'll try to read it
-            self.config_file = Path(quiz_config)
-
-            if not self.config_file.is_absolute():
-                self.config_file = self.working_dir / self.config_file
-
-            with open(self.config_file) as ff:
-                self.config = json.load(ff)
+        # Read in config and set up the session
+        self.engine = QuizEngine(quiz_config, **kwargs)
+        self.tracer = self.engine.tracer
 
         # Store key info from config
-        self.options = self.config.get("Options", {})
-        self.questions = self.config.get("Questions", [])
-        self.results = self.config.get("Results", {})
-
-        # Setup Question Order
-        self.n_qs = len(self.questions)
-        self.q_order = np.arange(self.n_qs)
-        if self.options.get("Random Order", False):
-            np.random.shuffle(self.q_order)
+        self.config = self.engine.config
+        self.options = self.engine.options
+        self.questions = self.engine.questions
+        self.results = self.engine.results
 
         # Setup Layout
         self.lay = QVBoxLayout()
         self.setLayout(self.lay)
 
         # Add Title Label
-        self.title = self.config.get("Quiz Name", "")
+        self.title = self.engine.title
         self.setWindowTitle(self.title)
 
         title_lab = QLabel(self.title)
         title_lab.setStyleSheet(" font-size: 100px; qproperty-alignment: AlignCenter;")
         self.lay.addWidget(title_lab)
 
-        # Setup Progressbar
-        self.cur_q_idx = -1
-        self.max_qs = self.options.get("Max Questions", np.inf)
-        
-
-        # Determine after how many questions to stop
-        if self.max_qs < self.n_qs : # Number has been limited in the config, stop at the defined limit
-            self.pbar_end = self.max_qs
-        else: # number of questions hasn't been limited, stop when you've run out of questions
-            self.pbar_end = self.n_qs
+        # Recycling keeps one question view and one results view alive and updates them in place
+        self.recycle = kwargs.get("recycle", True)
+        if self.recycle:
+            self.question_view = QuickQuestion(n_buttons=self.engine.max_ans)
+            self.question_view.procDone.connect(self.next_question)
+            self.lay.addWidget(self.question_view)
 
+        # Setup Progressbar
         self.pbar = QProgressBar()
         self.lay.addWidget(self.pbar)
 
-        # Figure out the largest number of answers for any question
-        n_ans = [len(q["answers"]) for q in self.questions]
-        self.max_ans = max(n_ans)
+        if self.recycle:
+            self.build_results_view()
+
+        # Setup image loading, result images get fetched in the background while questions are answered
+        self.img_url = None
+        self.pix_lab = None
+        self.results_shown = None
+        if "image_cache" in kwargs:
+            image_cache = kwargs["image_cache"]
+        else:
+            # No disk cache is better than no quiz, e.g. an unwritable QUIZZER_CACHE_DIR
+            try:
+                image_cache = get_default_cache()
+            except (OSError, ValueError) as e:
+                print(f"Unable to open image cache, images won't be cached: {e}")
+                image_cache = None
+        self.img_loader = ImageLoader(height=480, cache=image_cache, tracer=self.tracer)
+        self.img_loader.loaded.connect(self.set_result_image)
+        self.img_loader.failed.connect(self.result_image_failed)
 
-        # Setup containers
-        self.answers = np.zeros(self.n_qs) * np.nan
+        # Prefetching starts after the first paint, see paintEvent
+        self.prefetch_started = False
 
         self.next_question()
 
@@ -129,63 +156,138 @@ class QuickQuiz(QDialog):
         """
         Take an array of scores and return a seed
         """
-        # Generate the bit formatting string
-        n_bits = int(np.ceil(np.log2(self.max_ans)))
-        fmt_str = "{0:0"+str(n_bits)+"b}"
-        
-        # Convert answers to int
-        self.answers = self.answers.astype(np.int64)
-
-        # Convert each element in answers to a bit string
-        bits = [fmt_str.format(ans) for ans in self.answers]
-        bit_string = "".join(bits)
-            
-        # Convert the combined bit string back to an integer
-        seed = int(bit_string, 2)
-
-        return seed
+        return self.engine.tabulate_score()
 
     def next_question(self):
         """
         Detect that a question has been answered and populate the next question
         """
-        # Grab the old question
-        wid = self.lay.itemAt(1)
-        if wid is not None and isinstance(wid.widget(), QuickQuestion) :
-            # Save off the answer
-            idx = self.q_order[self.cur_q_idx]
-            # self.answers.append(wid.widget().get_value())
-            self.answers[idx] = wid.widget().get_value()
-            # print(self.answers[-1])
+        with self.tracer.span("next_question"):
+            if self.recycle:
+                # Save off the answer if a question was up
+                if self.engine.cur_q_idx >= 0:
+                    self.engine.record_answer(self.question_view.get_value())
+            else:
+                # Grab the old question
+                wid = self.lay.itemAt(1)
+                if wid is not None and isinstance(wid.widget(), QuickQuestion) :
+                    # Save off the answer
+                    self.engine.record_answer(wid.widget().get_value())
 
-            # Delete the old question
-            wid.widget().deleteLater()
-            self.lay.removeItem(wid)
+                    # Delete the old question
+                    wid.widget().deleteLater()
+                    self.lay.removeItem(wid)
 
 
-        # Update the index and progressbar
-        self.cur_q_idx += 1
-        self.pbar.setValue(100 * self.cur_q_idx / self.pbar_end)
+            # Update the index and progressbar
+            q = self.engine.next_question()
+            self.set_progress(self.engine.progress)
 
 
-        # Check if you've reached the last question
-        if self.cur_q_idx >= self.pbar_end:
-            self.show_results()
-            # self.populate_img()
-            return
+            # Check if you've reached the last question
+            if q is None:
+                self.show_results()
+                # self.populate_img()
+                return
+
 
+            # populate the next question
+            if self.recycle:
+                self.question_view.set_question(text="\n"+q["text"]+"\n", answers=q["answers"])
+                return
 
-        # populate the next question
-        idx = self.q_order[self.cur_q_idx]
-        q = self.questions[idx]
-        wid = QuickQuestion(text="\n"+q["text"]+"\n", answers=q["answers"])
-        wid.procDone.connect(self.next_question)
+            wid = QuickQuestion(text="\n"+q["text"]+"\n", answers=q["answers"])
+            wid.procDone.connect(self.next_question)
 
-        self.lay.insertWidget(1, wid)
+            self.lay.insertWidget(1, wid)
 
 
+    def set_progress(self, value):
+        """
+        QProgressBar.setValue repaints on the spot, which for a bar that's just been shown
+        means the whole window. With updates off it's left to the next paint with everything else.
+        """
+        self.pbar.setUpdatesEnabled(False)
+        self.pbar.setValue(value)
+        self.pbar.setUpdatesEnabled(True)
+
+    def build_results_view(self):
+        """
+        Build the results widgets once, they get filled in and shown at the end of every run
+        """
+        self.results_view = QWidget()
+        res_lay = QVBoxLayout()
+        res_lay.setContentsMargins(0, 0, 0, 0)
+        self.results_view.setLayout(res_lay)
+
+        self.head_lab = QLabel()
+        self.head_lab.setStyleSheet(" font-size: 60px;")
+        self.head_lab.setWordWrap(True)
+        res_lay.addWidget(self.head_lab)
+
+        self.result_lab = QLabel()
+        self.result_lab.setStyleSheet(" font-size: 55px; qproperty-alignment: AlignCenter;")
+        res_lay.addWidget(self.result_lab)
+
+        self.pix_view = QLabel()
+        self.pix_view.setStyleSheet(" font-size: 30px;")
+        res_lay.addWidget(self.pix_view, alignment=Qt.AlignCenter)
+
+        self.desc_lab = QLabel()
+        self.desc_lab.setStyleSheet(" font-size: 40px;")
+        res_lay.addWidget(self.desc_lab)
+
+        bot_but_lay = QHBoxLayout()
+
+        quit_butt = QPushButton("Quit")
+        quit_butt.clicked.connect(self.close)
+        bot_but_lay.addWidget(quit_butt)
+
+        retry_butt = QPushButton("Try again")
+        retry_butt.clicked.connect(self.reset)
+        bot_but_lay.addWidget(retry_butt)
+
+        res_lay.addLayout(bot_but_lay)
+
+        self.results_view.hide()
+        self.lay.addWidget(self.results_view)
+
+    def fill_results_view(self, result):
+        self.question_view.hide()
+        self.pbar.hide()
+
+        self.head_lab.setText(self.config.get("Results Header", ""))
+        self.result_lab.setText(result["Name"])
+
+        if result.get("image", None):
+            # Show a placeholder right away, the image gets swapped in once the loader has it
+            self.img_url = result["image"]
+            self.pix_lab = self.pix_view
+            self.pix_lab.clear()
+            self.pix_lab.setText("Loading image...")
+            self.pix_lab.show()
+
+            self.img_loader.request(self.img_url)
+        else:
+            self.pix_view.hide()
+
+        self.desc_lab.setText(result.get("description", None) or "")
+        self.desc_lab.setVisible(bool(result.get("description", None)))
+
+        self.results_view.show()
+
     def show_results(self):
-        
+        # Start the clock on how long the result image keeps the user waiting
+        self.results_shown = time.perf_counter()
+
+        if self.recycle:
+            # Score the answers and pick a result
+            result = self.engine.finalize()
+            self.result = result
+
+            self.fill_results_view(result)
+            return
+
         # delete pbar
         # Grab the old question
         wid = self.lay.itemAt(1)
@@ -194,18 +296,8 @@ class QuickQuiz(QDialog):
             wid.widget().deleteLater()
             self.lay.removeItem(wid)
 
-        # Get the answers array and convert it to a seed
-        seed = self.tabulate_score()
-
-        # Get weightings of all possible options
-        wgts = np.array([x["weight"] for x in self.results])
-        wgts = wgts / np.sum(wgts) # normalize the array
-
-        # Randomly generate an answer based on the seed
-        np.random.seed(seed)
-        choice = np.random.choice(np.arange(len(wgts)), p=wgts)
-        # print(choice)
-        result = self.results[choice]
+        # Score the answers and pick a result
+        result = self.engine.finalize()
         self.result = result
 
         # Add widgets
@@ -221,25 +313,13 @@ class QuickQuiz(QDialog):
 
         # print(result)
         if result.get("image", None):
-            try:
-                img_url = result["image"]
-                img = self.load_img_url(img_url)
-                
-                # Rescale image
-                scale = 480 / img.height
-                new_size = (int(img.width*scale), int(img.height*scale))
-                img = img.resize(new_size)
-
-                imgQt = ImageQt(img)
+            # Show a placeholder right away, the image gets swapped in once the loader has it
+            self.img_url = result["image"]
+            self.pix_lab = QLabel("Loading image...")
+            self.pix_lab.setStyleSheet(" font-size: 30px;")
+            self.lay.addWidget(self.pix_lab, alignment=Qt.AlignCenter)
 
-                pix = QPixmap.fromImage(imgQt)
-                self.pix_lab = QLabel()
-                self.pix_lab.setPixmap(pix)
-                self.lay.addWidget(self.pix_lab, alignment=Qt.AlignCenter)
-            except Exception as e:
-                print(e)
-
-            # print(f"Yo, we got an image here! {img}")
+            self.img_loader.request(self.img_url)
 
         if result.get("description", None):
             result_lab = QLabel(result["description"])
@@ -261,8 +341,56 @@ class QuickQuiz(QDialog):
 
         # sleep(0.1)
 
+    def paintEvent(self, event):
+        super(QuickQuiz, self).paintEvent(event)
+
+        # Only kick off prefetching once the first question is on screen, so the image
+        # workers pulling in requests and PIL never hold up the first paint
+        if not self.prefetch_started:
+            self.prefetch_started = True
+            QTimer.singleShot(0, self.prefetch_images)
+
+    def prefetch_images(self):
+        """
+        Queue up every result image so the results screen doesn't have to wait on the network
+        """
+        if self.options.get("Prefetch Images", True):
+            self.img_loader.prefetch([x.get("image", None) for x in self.results])
+
+    def set_result_image(self, url, pix):
+        if self.pix_lab is None or url != self.img_url:
+            return
+
+        self.pix_lab.setPixmap(pix)
+
+        if self.results_shown is not None:
+            self.tracer.record("result_image_wait", time.perf_counter() - self.results_shown, url=url)
+            self.results_shown = None
+
+    def result_image_failed(self, url, msg):
+        if self.pix_lab is None or url != self.img_url:
+            return
+
+        print(msg)
+        self.pix_lab.setText("")
+
     def reset(self):
-        self.cur_q_idx = -1
+        start = time.perf_counter()
+        self.img_url = None
+        self.pix_lab = None
+        self.results_shown = None
+
+        if self.recycle:
+            # Fill in the first question before showing it, so the layout only settles once
+            self.engine.reset()
+            self.questions = self.engine.questions
+            self.next_question()
+
+            self.results_view.hide()
+            self.question_view.show()
+            self.pbar.show()
+            self.tracer.record("reset", time.perf_counter() - start)
+            return
 
         # Delete all previous widgets
         for ii in range(1, self.lay.count()):
@@ -287,11 +415,10 @@ class QuickQuiz(QDialog):
         self.pbar = QProgressBar()
         self.lay.addWidget(self.pbar)
 
-        self.answers = np.zeros(self.n_qs) * np.nan
+        self.engine.reset()
+        self.questions = self.engine.questions
         self.next_question()
-
-    def load_img_url(self, url):
-        return Image.open(requests.get(url, stream=True).raw)
+        self.tracer.record("reset", time.perf_counter() - start)
 
     # def populate_img(self):
     #     img_url = self.result["image"]
@@ -358,31 +485,7 @@ if __name__ == '__main__':
 
     #==============================================================================================
 
-    # with open(r"F:\Documents_F\Python\trunk\Quizzer\src\main\python\whatjediareyou.json") as ff:
-    #     config = json.load(ff)
-
-    # for char in config["Results"]:
-    #     try:
-    #         img_url = char["image"]
-    #         img = Image.open(requests.get(img_url, stream=True).raw)
-            
-    #         # Rescale image
-    #         scale = 480 / img.height
-    #         new_size = (int(img.width*scale), int(img.height*scale))
-    #         img = img.resize(new_size)
-
-    #         imgQt = ImageQt(img)
-
-    #         pix = QPixmap.fromImage(imgQt)
-    #         pix_lab = QLabel()
-    #         pix_lab.setPixmap(pix)
-    #         # lf.lay.addWidget(self.pix_lab, alignment=Qt.AlignCenter)
-
-    #         print(char["Name"] + " is fine.")
-
-    #     except Exception as e:
-    #         print(char["Name"] + " FAILED!")
-    #         print(e)
-
+    # To check and warm every result image use prefetch.py, e.g.
+    #   python prefetch.py whatjediareyou.json --workers 16
 
     # print("done.")
\ No newline at end of file
@@ -0,0 +1,97 @@
+import numpy as np
+
+
+# splitmix64 constants
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def mix64(x):
+    """
+    splitmix64 finalizer, works elementwise on uint64 arrays (overflow wraps)
+    """
+    z = x + GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * MIX_1
+    z = (z ^ (z >> np.uint64(27))) * MIX_2
+    return z ^ (z >> np.uint64(31))
+
+
+def hash_words(words):
+    """
+    Stable 64 bit hash of each row of an N x W uint64 key matrix.
+    Doesn't depend on python's hash randomisation, numpy's global RNG or the platform.
+    """
+    words = np.asarray(words, dtype=np.uint64)
+    n_rows, n_words = words.shape
+
+    with np.errstate(over="ignore"):
+        h = mix64(np.full(n_rows, n_words, dtype=np.uint64))
+        for ww in range(n_words):
+            h = mix64(h ^ words[:, ww])
+
+    return h
+
+
+class ResultSampler(object):
+    """
+    Walker/Vose alias table over the result weights. Built once per quiz, after which
+    every draw is a constant time lookup no matter how many results there are.
+    """
+
+    def __init__(self, weights):
+        wgts = np.asarray(weights, dtype=np.float64)
+        self.n = len(wgts)
+
+        self.prob, self.alias = self.build_table(wgts / np.sum(wgts))
+
+    @staticmethod
+    def build_table(p):
+        n = len(p)
+        scaled = p * n
+
+        prob = np.ones(n)
+        alias = np.arange(n)
+
+        small = [ii for ii in range(n) if scaled[ii] < 1.0]
+        large = [ii for ii in range(n) if scaled[ii] >= 1.0]
+
+        while small and large:
+            ss = small.pop()
+            ll = large.pop()
+
+            prob[ss] = scaled[ss]
+            alias[ss] = ll
+
+            # Move the leftover mass from the large column
+            scaled[ll] = scaled[ll] + scaled[ss] - 1.0
+            if scaled[ll] < 1.0:
+                small.append(ll)
+            else:
+                large.append(ll)
+
+        # Anything left over is (up to rounding) exactly full
+        for ii in small + large:
+            prob[ii] = 1.0
+
+        return prob, alias
+
+    def draw(self, bits):
+        """
+        Map uint64 random bits onto result indices. The high half picks the column,
+        the low half decides between the column and its alias.
+        """
+        bits = np.asarray(bits, dtype=np.uint64)
+
+        col = ((bits >> np.uint64(32)) * np.uint64(self.n)) >> np.uint64(32)
+        col = col.astype(np.int64)
+        u = (bits & np.uint64(0xFFFFFFFF)) / 2.0**32
+
+        return np.where(u < self.prob[col], col, self.alias[col])
+
+    def sample_keys(self, words):
+        """
+        Deterministically pick a result for each row of a packed answer key matrix
+        """
+        return self.draw(hash_words(words))
+
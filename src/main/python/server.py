@@ -0,0 +1,373 @@
+"""
+Quiz server, runs the quizzes in a directory over HTTP/JSON.
+
+    python server.py --port 8080
+
+No Qt anywhere in here, scoring goes through the same QuizEngine the desktop
+dialog uses. Each quiz is loaded into one shared engine and every session is
+a packed QuizSession (see session.py), so one process can hold thousands of them.
+
+    GET    /quizzes                   quizzes that can be played
+    POST   /sessions                  {"quiz": name} -> new session and its first question
+    GET    /sessions/<id>             where the session is up to
+    POST   /sessions/<id>/answer      {"answer": index} -> next question, or the result
+    GET    /sessions/<id>/result      the result once every question is answered
+    DELETE /sessions/<id>             drop a session
+    GET    /stats[/<quiz>]            running answer, result and drop-off counts (see analytics.py)
+
+Idle sessions are dropped after --ttl seconds. With --log DIR completed sessions are
+appended to a session log (see sessionlog.py).
+"""
+import os
+import sys
+from pathlib import Path
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+from engine import QuizEngine
+from catalog import QuizCatalog
+from analytics import Analytics, get_analytics
+
+
+STATUS_TEXT = {
+    200: "OK",
+    201: "Created",
+    204: "No Content",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+class QuizServer(object):
+    """
+    Holds the loaded quizzes and live sessions, and answers HTTP requests for them
+    """
+
+    def __init__(self, directory, host="127.0.0.1", port=8080, ttl=30*60, max_sessions=100000,
+                 max_body=64*1024, **kwargs):
+        self.kwargs = kwargs
+
+        self.directory = Path(directory)
+        self.host = host
+        self.port = port
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_body = max_body
+
+        self.catalog = QuizCatalog(self.directory)
+        self.catalog.refresh()
+
+        # Every engine counts into the same analytics so /stats sees all of them
+        self.analytics = get_analytics(kwargs.get("analytics", None)) or Analytics()
+        self.kwargs["analytics"] = self.analytics
+
+        # name -> (content hash, engine), reloaded when the file changes
+        self.engines = {}
+        self.sessions = {}
+
+        self.server = None
+        self.clients = set()
+
+    # Quizzes --------------------------------------------------------------
+
+    async def get_engine(self, name):
+        entry = self.catalog.get(name)
+        if entry is None:
+            # Might be new since the last scan
+            await asyncio.get_running_loop().run_in_executor(None, self.catalog.refresh)
+            entry = self.catalog.get(name)
+
+        if entry is None:
+            raise HTTPError(404, f"No quiz called '{name}'")
+        if not entry["valid"]:
+            raise HTTPError(409, f"Quiz '{name}' can't be played: {entry['error']}")
+
+        cached = self.engines.get(name, None)
+        if cached is not None and cached[0] == entry["hash"]:
+            return cached[1]
+
+        # Parsing a big bank shouldn't stall every other session
+        engine = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: QuizEngine(self.catalog.path(name), **self.kwargs))
+        self.engines[name] = (entry["hash"], engine)
+        return engine
+
+    # Sessions -------------------------------------------------------------
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id, None)
+        if session is None:
+            raise HTTPError(404, f"No session '{session_id}'")
+        session.touched = time.monotonic()
+        return session
+
+    def expire_sessions(self):
+        cutoff = time.monotonic() - self.ttl
+        for session_id in [k for k, v in self.sessions.items() if v.touched < cutoff]:
+            session = self.sessions.pop(session_id)
+            session.engine.drop_session(session)
+
+    async def expire_loop(self):
+        while True:
+            await asyncio.sleep(min(self.ttl, 60))
+            self.expire_sessions()
+
+    def session_state(self, session):
+        """
+        JSON body describing a session, with its current question or its result
+        """
+        engine = session.engine
+        state = {
+            "session": session.id,
+            "quiz": session.quiz,
+            "title": engine.title,
+            "progress": engine.session_progress(session),
+            "finished": session.finished,
+        }
+
+        if session.finished:
+            state["result"] = self.result_state(session)
+        else:
+            q = engine.questions[session.question_index()]
+            state["question"] = {
+                "number": session.cur_q_idx + 1,
+                "total": session.end, # Comes in when the result is decided early
+                "text": q["text"],
+                "answers": list(q["answers"]),
+            }
+
+        return state
+
+    def result_state(self, session):
+        result = session.engine.results[session.result_idx]
+        return {
+            "header": session.engine.config.get("Results Header", ""),
+            "index": session.result_idx,
+            "name": result["Name"],
+            "description": result.get("description", None),
+            "image": result.get("image", None),
+        }
+
+    # Routes ---------------------------------------------------------------
+
+    async def route(self, method, path, body):
+        parts = [x for x in path.split("?")[0].split("/") if x]
+
+        if parts == ["quizzes"] and method == "GET":
+            return 200, [
+                {"name": x["name"], "title": x["title"], "questions": x["n_questions"], "results": x["n_results"]}
+                for x in (self.catalog.get(name) for name in self.catalog.names())
+                if x["valid"]
+            ]
+
+        if parts and parts[0] == "stats" and len(parts) <= 2 and method == "GET":
+            # Snapshots from other processes sharing the analytics directory get added in
+            combined = self.analytics.combined()
+            if len(parts) == 1:
+                return 200, combined.summary()
+
+            summary = combined.summary(parts[1])
+            if summary is None:
+                raise HTTPError(404, f"No stats for '{parts[1]}'")
+            return 200, summary
+
+        if parts == ["sessions"] and method == "POST":
+            if len(self.sessions) >= self.max_sessions:
+                self.expire_sessions()
+                if len(self.sessions) >= self.max_sessions:
+                    raise HTTPError(503, "Too many sessions")
+
+            name = body.get("quiz", None)
+            if not isinstance(name, str):
+                raise HTTPError(400, "Missing 'quiz'")
+            engine = await self.get_engine(name)
+
+            session = engine.new_session(uuid.uuid4().hex, name)
+            session.touched = time.monotonic()
+            self.sessions[session.id] = session
+            return 201, self.session_state(session)
+
+        if len(parts) >= 2 and parts[0] == "sessions":
+            session = self.get_session(parts[1])
+            rest = parts[2:]
+
+            if not rest and method == "GET":
+                return 200, self.session_state(session)
+
+            if not rest and method == "DELETE":
+                del self.sessions[session.id]
+                session.engine.drop_session(session)
+                return 204, None
+
+            if rest == ["answer"] and method == "POST":
+                if session.finished:
+                    raise HTTPError(409, "Every question has already been answered")
+                value = body.get("answer", None)
+                if not isinstance(value, int) or isinstance(value, bool):
+                    raise HTTPError(400, "'answer' must be an integer")
+                n_ans = session.engine.n_ans[session.question_index()]
+                if not 0 <= value < n_ans:
+                    raise HTTPError(400, f"Answer must be between 0 and {n_ans - 1}")
+
+                session.record_answer(value)
+                if session.engine.advance_session(session) is None:
+                    session.engine.complete_session(session)
+                return 200, self.session_state(session)
+
+            if rest == ["result"] and method == "GET":
+                if not session.finished:
+                    raise HTTPError(409, "Session isn't finished yet")
+                return 200, self.result_state(session)
+
+            raise HTTPError(405 if rest in ([], ["answer"], ["result"]) else 404, f"Can't {method} {path}")
+
+        raise HTTPError(404, f"Can't {method} {path}")
+
+    # HTTP -----------------------------------------------------------------
+
+    async def read_request(self, reader):
+        """
+        Read one request off a keep-alive connection, returns None when the client is done
+        """
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            return None
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, val = line.split(":", 1)
+                headers[key.strip().lower()] = val.strip()
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(400, "Malformed Content-Length")
+        if length > self.max_body:
+            raise HTTPError(413, "Request body too large")
+        raw = await reader.readexactly(length) if length else b""
+
+        keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+        return method, path, raw, keep_alive
+
+    def write_response(self, writer, status, payload, keep_alive):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        head = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+
+    async def handle_client(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    method, path, raw, keep_alive = request
+
+                    try:
+                        body = json.loads(raw) if raw else {}
+                    except ValueError:
+                        raise HTTPError(400, "Body isn't valid JSON")
+                    if not isinstance(body, dict):
+                        raise HTTPError(400, "Body must be a JSON object")
+
+                    status, payload = await self.route(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    print(e)
+                    status, payload = 500, {"error": "Internal server error"}
+
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=4096)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.expire_task = asyncio.get_running_loop().create_task(self.expire_loop())
+        return self
+
+    async def stop(self):
+        self.expire_task.cancel()
+        self.server.close()
+        # Idle keep-alive connections would otherwise hold wait_closed up
+        for writer in list(self.clients):
+            writer.close()
+        while self.clients:
+            await asyncio.sleep(0.01)
+        await self.server.wait_closed()
+
+        for quiz_hash, engine in self.engines.values():
+            if engine.session_log is not None:
+                engine.session_log.flush()
+        if self.analytics.directory is not None:
+            self.analytics.save()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Serving {len(self.catalog.names())} quizzes from {self.directory} on http://{self.host}:{self.port}")
+        async with self.server:
+            await self.server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve quizzes over HTTP/JSON")
+    parser.add_argument("--dir", type=Path, default=Path(os.path.dirname(os.path.realpath(__file__))), help="quiz directory")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on, 0 picks a free one")
+    parser.add_argument("--ttl", type=float, default=30*60, help="seconds before an idle session is dropped")
+    parser.add_argument("--max-sessions", type=int, default=100000, help="most live sessions to hold")
+    parser.add_argument("--log", type=Path, default=None, help="directory to log completed sessions to")
+    parser.add_argument("--analytics", type=Path, default=None, help="directory to share analytics snapshots through")
+    args = parser.parse_args(argv)
+
+    server = QuizServer(args.dir, host=args.host, port=args.port, ttl=args.ttl, max_sessions=args.max_sessions,
+                        session_log=args.log, analytics=args.analytics)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
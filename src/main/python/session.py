@@ -0,0 +1,121 @@
+"""
+Compact per-session state.
+
+A session is the order its questions are asked in and the answers given so far.
+Both are bit packed into plain python ints at the engine's widths:
+
+    order   order_bits per slot, the bank index asked at each position
+    codes   code_bits per question, 0 = unanswered, otherwise answer + 1
+
+code_bits is the n_bits scoring already uses for max_ans, plus a bit when the
+extra "unanswered" code doesn't fit. For a 13 question, 4 answer quiz that is two
+small ints per session, so millions of sessions fit in a server or batch job.
+"""
+import time
+
+import numpy as np
+
+
+UNANSWERED = -1
+
+
+def pack_codes(values, bits):
+    """
+    Pack small non-negative ints into one python int, bits each, first value lowest
+    """
+    packed = 0
+    for ii, val in enumerate(values):
+        packed |= int(val) << (ii * bits)
+    return packed
+
+
+def unpack_codes(packed, bits, n):
+    """
+    Inverse of pack_codes, returns an int64 array of n values
+    """
+    if n == 0 or bits == 0:
+        return np.zeros(n, dtype=np.int64)
+
+    raw = np.frombuffer(packed.to_bytes((n * bits + 7) // 8, "little"), dtype=np.uint8)
+    flat = np.unpackbits(raw, bitorder="little")[:n * bits].reshape(n, bits)
+    return flat.astype(np.int64) @ (1 << np.arange(bits, dtype=np.int64))
+
+
+class QuizSession(object):
+    """
+    One run through a quiz. Holds a reference to the (shared) engine for the
+    questions and bit widths, everything else is packed.
+    """
+    __slots__ = ("engine", "order", "codes", "cur_q_idx", "end", "result_idx", "id", "quiz", "started", "touched")
+
+    def __init__(self, engine, order, session_id=None, quiz=None, cur_q_idx=-1):
+        self.engine = engine
+        self.order = pack_codes(order[:int(engine.pbar_end)], engine.order_bits)
+        self.codes = 0
+        self.cur_q_idx = cur_q_idx
+        self.end = int(engine.pbar_end) # Can be brought forward once the result is decided
+        self.result_idx = None
+        self.id = session_id
+        self.quiz = quiz
+        self.started = time.time()
+        self.touched = 0.0
+
+    @property
+    def finished(self):
+        return self.cur_q_idx >= self.end
+
+    def question_index(self, pos=None):
+        """
+        Bank index of the question asked at pos, the current one by default
+        """
+        if pos is None:
+            pos = self.cur_q_idx
+        bits = self.engine.order_bits
+        return (self.order >> (pos * bits)) & ((1 << bits) - 1)
+
+    def order_array(self):
+        return unpack_codes(self.order, self.engine.order_bits, int(self.engine.pbar_end))
+
+    def record_answer(self, value):
+        """
+        Save off the answer to the current question
+        """
+        bits = self.engine.code_bits
+        shift = self.question_index() * bits
+        self.codes = (self.codes & ~(((1 << bits) - 1) << shift)) | ((int(value) + 1) << shift)
+
+    def set_answers(self, answers):
+        """
+        Overwrite every answer at once, NaN or UNANSWERED marks the ones not answered
+        """
+        answers = np.asarray(answers, dtype=np.float64)
+        codes = np.where(np.isnan(answers) | (answers < 0), 0, answers + 1)
+        self.codes = pack_codes(codes.astype(np.int64), self.engine.code_bits)
+
+    def answer_codes(self):
+        """
+        Every question's raw answer code, 0 = unanswered, otherwise answer + 1
+        """
+        return unpack_codes(self.codes, self.engine.code_bits, self.engine.n_qs)
+
+    def answers(self):
+        """
+        Every question's answer as an int64 array, UNANSWERED for the ones not answered
+        """
+        return self.answer_codes() - 1
+
+    def asked(self):
+        """
+        The questions asked so far, in the order they were asked, and their raw answer codes
+        """
+        questions = self.order_array()[:max(min(self.cur_q_idx, self.end), 0)]
+        bits = self.engine.code_bits
+        codes = np.array([(self.codes >> (int(q) * bits)) & ((1 << bits) - 1) for q in questions], dtype=np.int64)
+        return questions, codes
+
+    def answer_matrix(self):
+        """
+        1 x Q int matrix for scoring, unanswered questions count as the first answer
+        """
+        return np.maximum(self.answers(), 0)[np.newaxis]
+
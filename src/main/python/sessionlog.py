@@ -0,0 +1,258 @@
+"""
+Append-only log of completed sessions.
+
+    python sessionlog.py ~/.quizzer/sessions        # summarise a log directory
+
+Finished sessions are buffered in memory per quiz and written out in batches, as
+one columnar block per quiz per flush:
+
+    header    magic, quiz id length, row count, asked question count, question and code dtypes
+    quiz id   utf-8
+    columns   started   f8[n]    unix time the session began
+              duration  f4[n]    seconds from start to finish
+              result    u2[n]    chosen result index
+              asked     u4[n]    how many questions each session was asked
+              questions u2[m]    bank index of every asked question, session after session
+                                 in the order they were asked (u4 for banks over 65535)
+              codes     u1[m]    the answer code for each of those, 0 = unanswered,
+                                 otherwise answer + 1 (u2 over 254 answers)
+
+Only the questions a session was actually asked are stored, so a short session
+from a huge bank costs a few bytes, not a row the width of the bank.
+
+Blocks only ever get appended, a flush is a single write with no fsync, and files
+are rotated once they pass max_bytes. Reading stops cleanly at a partly written
+last block, so a crash loses at most the unflushed buffer.
+"""
+import os
+import sys
+from pathlib import Path
+import time
+import struct
+import atexit
+import argparse
+import threading
+
+import numpy as np
+
+
+MAGIC = b"QZL2"
+HEADER = struct.Struct("<4sHII1s1s")
+SUFFIX = ".qzl"
+
+
+class SessionLog(object):
+    """
+    Buffers completed sessions and appends them to rotating log files in batches
+    """
+
+    def __init__(self, directory, batch_size=4096, flush_every=5.0, max_bytes=64*1024*1024, max_files=None,
+                 fsync=False, **kwargs):
+        self.kwargs = kwargs
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.batch_size = batch_size
+        self.flush_every = flush_every
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.fsync = fsync
+
+        self.lock = threading.Lock()
+        self.buffers = {} # quiz id -> list of (started, duration, result, codes)
+        self.n_buffered = 0
+        self.last_flush = time.monotonic()
+
+        self.file = None
+        self.path = None
+
+        atexit.register(self.close)
+
+    def record(self, quiz, questions, codes, result, started, finished=None):
+        """
+        Queue one completed session, questions are the bank indices it was asked and codes their answer codes
+        """
+        if finished is None:
+            finished = time.time()
+
+        with self.lock:
+            self.buffers.setdefault(quiz, []).append((started, finished - started, result, questions, codes))
+            self.n_buffered += 1
+            due = self.n_buffered >= self.batch_size or time.monotonic() - self.last_flush > self.flush_every
+
+        if due:
+            self.flush()
+
+    def encode_block(self, quiz, rows):
+        name = quiz.encode("utf-8")
+        questions = np.concatenate([np.asarray(x[3], dtype=np.int64) for x in rows])
+        codes = np.concatenate([np.asarray(x[4], dtype=np.int64) for x in rows])
+        q_dtype = np.dtype("<u2" if questions.max(initial=0) < 1 << 16 else "<u4")
+        c_dtype = np.dtype("<u1" if codes.max(initial=0) < 1 << 8 else "<u2")
+
+        parts = [
+            HEADER.pack(MAGIC, len(name), len(rows), len(questions), q_dtype.char.encode(), c_dtype.char.encode()),
+            name,
+            np.array([x[0] for x in rows], dtype="<f8").tobytes(),
+            np.array([x[1] for x in rows], dtype="<f4").tobytes(),
+            np.array([x[2] for x in rows], dtype="<u2").tobytes(),
+            np.array([len(x[3]) for x in rows], dtype="<u4").tobytes(),
+            questions.astype(q_dtype).tobytes(),
+            codes.astype(c_dtype).tobytes(),
+        ]
+        return b"".join(parts)
+
+    def open_file(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        for ii in range(1000):
+            path = self.directory / f"sessions-{stamp}-{ii:03d}{SUFFIX}"
+            if not path.exists():
+                break
+        self.path = path
+        self.file = open(path, "ab")
+
+    def rotate(self):
+        self.close_file()
+
+        if self.max_files is not None:
+            logs = sorted(self.directory.glob("*" + SUFFIX))
+            for path in logs[:max(len(logs) - self.max_files + 1, 0)]:
+                path.unlink()
+
+    def close_file(self):
+        if self.file is None:
+            return
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+
+    def flush(self):
+        """
+        Write every buffered session out, one block per quiz
+        """
+        with self.lock:
+            buffers, self.buffers = self.buffers, {}
+            self.n_buffered = 0
+            self.last_flush = time.monotonic()
+
+            if not buffers:
+                return
+
+            blocks = []
+            for quiz, rows in buffers.items():
+                try:
+                    blocks.append(self.encode_block(quiz, rows))
+                except (ValueError, OverflowError, struct.error) as e: # Drop the bad batch, keep the rest
+                    print(f"Unable to encode session log block for '{quiz}': {e}")
+            data = b"".join(blocks)
+
+            try:
+                if self.file is None:
+                    self.open_file()
+                self.file.write(data)
+                self.file.flush()
+
+                if self.file.tell() >= self.max_bytes:
+                    self.rotate()
+            except OSError as e: # Losing analytics shouldn't take the quiz down with it
+                print(f"Unable to write session log: {e}")
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.close_file()
+
+
+def read_blocks(path):
+    """
+    Yield (quiz, columns) for every complete block in a log file
+    """
+    with open(path, "rb") as ff:
+        data = ff.read()
+
+    pos = 0
+    while pos + HEADER.size <= len(data) and data[pos:pos + 4] == MAGIC:
+        magic, name_len, n_rows, n_asked, q_char, c_char = HEADER.unpack_from(data, pos)
+        pos += HEADER.size
+        layout = (("started", "<f8", n_rows), ("duration", "<f4", n_rows), ("result", "<u2", n_rows),
+                  ("asked", "<u4", n_rows), ("questions", "<" + q_char.decode(), n_asked),
+                  ("codes", "<" + c_char.decode(), n_asked))
+
+        size = name_len + sum(np.dtype(dt).itemsize * count for key, dt, count in layout)
+        if pos + size > len(data): # Partly written last block
+            break
+
+        quiz = data[pos:pos + name_len].decode("utf-8")
+        pos += name_len
+
+        columns = {}
+        for key, dt, count in layout:
+            columns[key] = np.frombuffer(data, dtype=dt, count=count, offset=pos)
+            pos += columns[key].nbytes
+
+        yield quiz, columns
+
+
+def load_log(directory, quiz=None):
+    """
+    Read every log file in a directory, returns quiz id -> concatenated columns
+    """
+    blocks = {}
+    for path in sorted(Path(directory).glob("*" + SUFFIX)):
+        for name, columns in read_blocks(path):
+            if quiz is None or name == quiz:
+                blocks.setdefault(name, []).append(columns)
+
+    return {
+        name: {key: np.concatenate([x[key].astype(np.int64) if key in ("questions", "codes") else x[key]
+                                    for x in parts]) for key in parts[0]}
+        for name, parts in blocks.items()
+    }
+
+
+session_logs = {}
+
+
+def get_session_log(target=None):
+    """
+    SessionLog for a directory, None when logging is off (no target and no QUIZZER_SESSION_LOG).
+    Every engine writing to a directory shares one log, so their batches go out together.
+    """
+    if isinstance(target, SessionLog):
+        return target
+
+    if target is None:
+        target = os.environ.get("QUIZZER_SESSION_LOG", None)
+    if not target:
+        return None
+
+    target = str(Path(target).expanduser())
+    if target not in session_logs:
+        session_logs[target] = SessionLog(target)
+    return session_logs[target]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a completed session log")
+    parser.add_argument("directory", type=Path, help="log directory")
+    parser.add_argument("--quiz", default=None, help="only this quiz")
+    parser.add_argument("--top", type=int, default=5, help="results to list per quiz")
+    args = parser.parse_args(argv)
+
+    for name, cols in sorted(load_log(args.directory, args.quiz).items()):
+        n = len(cols["result"])
+        answered = np.count_nonzero(cols["codes"]) / max(cols["codes"].size, 1)
+        print(f"{name}: {n} sessions, median {np.median(cols['duration']):.1f}s, "
+              f"{np.mean(cols['asked']):.1f} questions asked, {answered:.1%} of them answered")
+
+        counts = np.bincount(cols["result"])
+        for idx in np.argsort(-counts)[:args.top]:
+            print(f"    result {idx:<5} {counts[idx]:8d} {counts[idx] / n:8.4f}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Outcome distribution simulator for quiz authors.
+
+    python simulate.py whatjediareyou.json --samples 2000000 --workers 8
+
+Shows how a quiz's answers actually turn into results. Small answer spaces are
+enumerated completely, larger ones are Monte Carlo sampled with uniformly random
+answers. Work is split into chunks of whole NumPy batches spread over a process
+pool, and reported as:
+
+    result frequencies     how often each result comes up, next to its configured weight
+    question influence     how often changing one question's answer changes the result
+    answer distributions   the results each individual answer leads to
+"""
+import os
+import sys
+from pathlib import Path
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from engine import QuizEngine
+from outcomes import space_size, enumerate_answers
+
+
+# Each worker process loads the quiz once
+worker_engine = None
+
+
+def init_worker(quiz_config, kwargs):
+    global worker_engine
+    worker_engine = QuizEngine(quiz_config, **kwargs)
+
+
+def tally(engine, answers, rng):
+    """
+    Score one batch of answers and count everything the report needs
+    """
+    n_rows, n_qs = answers.shape
+    n_res = len(engine.results)
+    max_ans = int(engine.max_ans)
+
+    res = engine.select_results(answers).astype(np.int64)
+    result_counts = np.bincount(res, minlength=n_res)
+
+    # Results per (question, answer)
+    flat = (np.arange(n_qs) * max_ans + answers) * n_res + res[:, np.newaxis]
+    answer_counts = np.bincount(flat.ravel(), minlength=n_qs * max_ans * n_res)
+
+    # Change each question's answer to a different one and see if the result moves
+    n_ans = np.asarray(engine.n_ans, dtype=np.int64)
+    changed = np.zeros(n_qs, dtype=np.int64)
+    for qq in range(n_qs):
+        if n_ans[qq] < 2:
+            continue
+        flipped = answers.copy()
+        flipped[:, qq] = (answers[:, qq] + rng.integers(1, n_ans[qq], size=n_rows)) % n_ans[qq]
+        changed[qq] = np.count_nonzero(engine.select_results(flipped) != res)
+
+    return n_rows, result_counts, answer_counts, changed
+
+
+def run_range(start, stop):
+    """
+    Worker job: enumerate rows [start, stop) of the answer space
+    """
+    rng = np.random.default_rng(start)
+    return tally(worker_engine, enumerate_answers(worker_engine.n_ans, start, stop), rng)
+
+
+def run_random(seed, n_rows):
+    """
+    Worker job: score n_rows uniformly random answer vectors
+    """
+    rng = np.random.default_rng(seed)
+    n_ans = np.asarray(worker_engine.n_ans, dtype=np.int64)
+    answers = (rng.random((n_rows, len(n_ans))) * n_ans).astype(np.int64)
+    return tally(worker_engine, answers, rng)
+
+
+def simulate(quiz_config, samples=1_000_000, workers=None, chunk=1 << 16, enumerate_limit=1 << 22, seed=0, **kwargs):
+    """
+    Run the simulation and return the report as a dict
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    engine = QuizEngine(quiz_config, **kwargs)
+    n_qs = engine.n_qs
+    n_res = len(engine.results)
+    max_ans = int(engine.max_ans)
+
+    size = space_size(engine.n_ans)
+    exhaustive = size <= enumerate_limit
+
+    start = time.perf_counter()
+    if exhaustive:
+        jobs = [(run_range, (lo, min(lo + chunk, size))) for lo in range(0, size, chunk)]
+    else:
+        seeds = np.random.SeedSequence(seed).spawn(int(np.ceil(samples / chunk)))
+        jobs = [(run_random, (ss, min(chunk, samples - ii * chunk))) for ii, ss in enumerate(seeds)]
+
+    total = 0
+    result_counts = np.zeros(n_res, dtype=np.int64)
+    answer_counts = np.zeros(n_qs * max_ans * n_res, dtype=np.int64)
+    changed = np.zeros(n_qs, dtype=np.int64)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(quiz_config, kwargs)) as pool:
+        futures = [pool.submit(func, *args) for func, args in jobs]
+        for fut in futures:
+            n_rows, res, ans, chg = fut.result()
+            total += n_rows
+            result_counts += res
+            answer_counts += ans
+            changed += chg
+
+    answer_counts = answer_counts.reshape(n_qs, max_ans, n_res)
+
+    report = {
+        "quiz": engine.title,
+        "mode": "exhaustive" if exhaustive else "monte carlo",
+        "answer_space": size,
+        "evaluated": total,
+        "workers": workers,
+        "seconds": time.perf_counter() - start,
+        "results": [
+            {
+                "name": x["Name"],
+                "weight": float(engine.weights[ii]),
+                "frequency": result_counts[ii] / total,
+                "count": int(result_counts[ii]),
+            }
+            for ii, x in enumerate(engine.results)
+        ],
+        "influence": (changed / total).tolist(),
+        "answers": [
+            [
+                {
+                    "text": engine.questions[qq]["answers"][aa],
+                    "distribution": (answer_counts[qq, aa] / max(answer_counts[qq, aa].sum(), 1)).tolist(),
+                }
+                for aa in range(int(engine.n_ans[qq]))
+            ]
+            for qq in range(n_qs)
+        ],
+    }
+
+    return report
+
+
+def print_report(report, top=3):
+    print(f"{report['quiz']}: {report['mode']}, {report['evaluated']} of {report['answer_space']} "
+          f"answer vectors in {report['seconds']:.2f}s on {report['workers']} workers")
+
+    print("\nResult frequencies (observed vs weight)")
+    for row in sorted(report["results"], key=lambda x: -x["frequency"]):
+        print(f"    {row['name']:<30} {row['frequency']:8.4f} {row['weight']:8.4f}")
+
+    print("\nQuestion influence (chance a different answer changes the result)")
+    for qq, val in enumerate(report["influence"]):
+        print(f"    q{qq:<4} {val:8.4f}")
+
+    print(f"\nTop {top} results per answer")
+    names = [x["name"] for x in report["results"]]
+    for qq, answers in enumerate(report["answers"]):
+        for aa, row in enumerate(answers):
+            dist = np.asarray(row["distribution"])
+            best = np.argsort(-dist)[:top]
+            summary = ", ".join(f"{names[ii]} {dist[ii]:.3f}" for ii in best)
+            print(f"    q{qq} a{aa}: {summary}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate how a quiz's answers turn into results")
+    parser.add_argument("quiz", type=Path, help="quiz file (.json or .qzb)")
+    parser.add_argument("--samples", type=int, default=1_000_000, help="Monte Carlo samples when the space is too big to enumerate")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the cpu count")
+    parser.add_argument("--chunk", type=int, default=1 << 16, help="answer vectors per batch")
+    parser.add_argument("--enumerate-limit", type=int, default=1 << 22, help="largest answer space to enumerate")
+    parser.add_argument("--seed", type=int, default=0, help="Monte Carlo seed")
+    parser.add_argument("--json", type=Path, default=None, help="write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    report = simulate(str(args.quiz.resolve()), samples=args.samples, workers=args.workers, chunk=args.chunk,
+                      enumerate_limit=args.enumerate_limit, seed=args.seed)
+    print_report(report)
+
+    if args.json is not None:
+        with open(args.json, "w") as ff:
+            json.dump(report, ff, indent=4)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
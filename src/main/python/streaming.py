@@ -0,0 +1,139 @@
+import re
+import json
+
+import numpy as np
+
+
+WHITESPACE = re.compile(r"\s*")
+
+
+class JsonStream(object):
+    """
+    Pull JSON values one at a time out of a file without reading the whole thing.
+    Only the structure around the values is walked by hand, the values themselves
+    go through the stdlib decoder.
+    """
+
+    def __init__(self, ff, chunk_size=1 << 16):
+        self.ff = ff
+        self.chunk_size = chunk_size
+
+        self.buf = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """
+        Read another chunk, dropping what's already been consumed. Returns False at end of file
+        """
+        data = self.ff.read(self.chunk_size)
+        if not data:
+            return False
+
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Next non-whitespace character, "" at end of file
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' at character {self.pos} but found '{found}'")
+        self.pos += 1
+
+    def skip(self, char):
+        """
+        Step over char if it's next, returns whether it was there
+        """
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        """
+        Decode the next complete value
+        """
+        self.peek()
+        while True:
+            try:
+                val, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+
+            # A number right at the end of the buffer might carry on in the next chunk
+            if end == len(self.buf) and self.fill():
+                continue
+
+            self.pos = end
+            return val
+
+
+def stream_quiz(path, sample_size=None, rng=None):
+    """
+    Read a quiz file keeping only a uniform random sample of its questions.
+
+    Questions are read one record at a time and reservoir sampled, so only
+    sample_size of them are ever held at once. If sample_size isn't given the
+    quiz's "Max Questions" option is used, which has to come before "Questions"
+    in the file for this to help (otherwise every question is kept).
+
+    Returns (config without questions, sampled bank indices, sampled questions, bank size),
+    the sample is sorted by bank index.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    config = {}
+    idx = []
+    questions = []
+    n_seen = 0
+
+    with open(path, encoding="utf-8") as ff:
+        js = JsonStream(ff)
+
+        js.expect("{")
+        while not js.skip("}"):
+            key = js.value()
+            js.expect(":")
+
+            if key != "Questions":
+                config[key] = js.value()
+            else:
+                k = sample_size
+                if k is None:
+                    k = config.get("Options", {}).get("Max Questions", np.inf)
+
+                js.expect("[")
+                while not js.skip("]"):
+                    q = js.value()
+
+                    # Algorithm R, keep the first k then replace with decreasing probability
+                    if n_seen < k:
+                        idx.append(n_seen)
+                        questions.append(q)
+                    else:
+                        jj = rng.integers(0, n_seen + 1)
+                        if jj < k:
+                            idx[jj] = n_seen
+                            questions[jj] = q
+
+                    n_seen += 1
+                    js.skip(",")
+
+            js.skip(",")
+
+    order = np.argsort(idx, kind="stable")
+    return config, np.array(idx, dtype=np.int64)[order], [questions[ii] for ii in order], n_seen
@@ -0,0 +1,160 @@
+"""
+Opt-in timing instrumentation for the quiz lifecycle.
+
+Turned on with the QUIZZER_TRACE environment variable or the trace kwarg that
+QuizEngine / QuickQuiz pass through:
+
+    QUIZZER_TRACE=stderr              JSON lines on stderr
+    QUIZZER_TRACE=/var/log/quiz.jsonl JSON lines appended to a file, one per span
+    QUIZZER_TRACE=/var/lib/quiz.prom  Prometheus text exposition, rewritten on flush
+
+Every span also lands in a per-name histogram, so prometheus() works whichever
+output is used. When tracing is off everything goes to a NullTracer whose spans
+do nothing.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager, nullcontext
+
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class NullTracer(object):
+    """
+    Does nothing, used when tracing is off
+    """
+    enabled = False
+    null_span = nullcontext()
+
+    def span(self, name, **attrs):
+        return self.null_span
+
+    def record(self, name, seconds, **attrs):
+        pass
+
+    def flush(self):
+        pass
+
+
+class Tracer(object):
+    """
+    Times spans, keeps a histogram per span name and writes them out as JSON lines
+    or Prometheus text. Safe to use from the image worker threads.
+    """
+    enabled = True
+
+    def __init__(self, target="stderr", fmt=None, buckets=BUCKETS, flush_every=10.0, **kwargs):
+        self.kwargs = kwargs
+
+        self.target = str(target)
+        if fmt is None:
+            fmt = "prometheus" if self.target.endswith(".prom") else "jsonl"
+        self.fmt = fmt
+
+        self.buckets = buckets
+        self.flush_every = flush_every
+        self.last_flush = time.monotonic()
+
+        self.lock = threading.Lock()
+        self.hists = {}
+
+        self.stream = None
+        if self.fmt == "jsonl":
+            self.stream = sys.stderr if self.target == "stderr" else open(self.target, "a", buffering=1)
+
+        atexit.register(self.flush)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **attrs)
+
+    def record(self, name, seconds, **attrs):
+        with self.lock:
+            hist = self.hists.get(name, None)
+            if hist is None:
+                hist = self.hists[name] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+
+            for ii, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    break
+            else:
+                ii = len(self.buckets)
+            hist["counts"][ii] += 1
+            hist["sum"] += seconds
+            hist["count"] += 1
+
+            if self.stream is not None:
+                row = {"ts": time.time(), "span": name, "ms": seconds * 1000, "thread": threading.current_thread().name}
+                row.update(attrs)
+                self.stream.write(json.dumps(row) + "\n")
+
+        if self.fmt == "prometheus" and time.monotonic() - self.last_flush > self.flush_every:
+            self.flush()
+
+    def prometheus(self):
+        """
+        Histograms in Prometheus text exposition format
+        """
+        lines = [
+            "# HELP quizzer_span_seconds Time spent in quiz lifecycle spans",
+            "# TYPE quizzer_span_seconds histogram",
+        ]
+
+        with self.lock:
+            for name, hist in sorted(self.hists.items()):
+                total = 0
+                for bound, count in zip(self.buckets, hist["counts"]):
+                    total += count
+                    lines.append(f'quizzer_span_seconds_bucket{{span="{name}",le="{bound}"}} {total}')
+                lines.append(f'quizzer_span_seconds_bucket{{span="{name}",le="+Inf"}} {hist["count"]}')
+                lines.append(f'quizzer_span_seconds_sum{{span="{name}"}} {hist["sum"]}')
+                lines.append(f'quizzer_span_seconds_count{{span="{name}"}} {hist["count"]}')
+
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+
+        if self.fmt == "prometheus":
+            tmp = self.target + ".tmp"
+            with open(tmp, "w") as ff:
+                ff.write(self.prometheus())
+            os.replace(tmp, self.target)
+        elif self.stream is not None:
+            self.stream.flush()
+
+
+NULL_TRACER = NullTracer()
+tracers = {}
+
+
+def get_tracer(trace=None):
+    """
+    Resolve QuizEngine's trace kwarg (or QUIZZER_TRACE) to a tracer. True means stderr,
+    a path ending .prom gets Prometheus text, False or nothing set turns tracing off.
+    One Tracer per target, two engines tracing to the same file must not both append to it.
+    """
+    if isinstance(trace, (Tracer, NullTracer)):
+        return trace
+
+    if trace is None:
+        trace = os.environ.get("QUIZZER_TRACE", None)
+    if trace is True:
+        trace = "stderr"
+    if not trace:
+        return NULL_TRACER
+
+    trace = str(trace)
+    if trace not in tracers:
+        tracers[trace] = Tracer(trace)
+    return tracers[trace]
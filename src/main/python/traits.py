@@ -0,0 +1,121 @@
+"""
+Trait scoring, the deterministic alternative to the seeded random draw.
+
+Any answer in a quiz can be a dict carrying a score vector over the Results
+instead of a plain string:
+
+    "answers": [
+        {"text": "Use the Force.", "scores": {"Yoda": 3, "Mace Windu": 1}},
+        {"text": "Blast it.", "scores": [0, 2, 0, 1, ...]},
+        "Say nothing."
+    ]
+
+scores is either a {result name: score} dict or a list with one score per result,
+plain string answers score nothing. A session's result is the argmax of its summed
+scores (ties go to the earlier result). Trait scoring is used when any answer has
+scores, or can be forced on or off with "Scoring": "traits" / "random" in Options.
+
+The scores are compiled into one (Q * (max_ans + 1)) x R matrix with an all zero
+row per question for "unanswered", so scoring N sessions is a single one-hot
+matrix product.
+"""
+import numpy as np
+
+
+def answer_text(ans):
+    return ans if isinstance(ans, str) else ans.get("text", "")
+
+
+def has_scores(questions):
+    return any(isinstance(ans, dict) and "scores" in ans for q in questions for ans in q["answers"])
+
+
+def plain_questions(questions):
+    """
+    Questions with every answer reduced to its text, for display
+    """
+    return [dict(q, answers=[answer_text(ans) for ans in q["answers"]]) for q in questions]
+
+
+def answer_scores(ans, names):
+    """
+    Score vector of a single answer over the results
+    """
+    out = np.zeros(len(names))
+    scores = ans.get("scores", None) if isinstance(ans, dict) else None
+
+    if isinstance(scores, dict):
+        lookup = {name: ii for ii, name in enumerate(names)}
+        for name, val in scores.items():
+            if name not in lookup:
+                raise ValueError(f"Answer '{answer_text(ans)}' scores unknown result '{name}'")
+            out[lookup[name]] = val
+    elif scores is not None:
+        if len(scores) != len(names):
+            raise ValueError(f"Answer '{answer_text(ans)}' has {len(scores)} scores for {len(names)} results")
+        out[:] = scores
+
+    return out
+
+
+def score_rows(questions, results):
+    """
+    One score row per answer, every question's answers back to back
+    """
+    names = [x["Name"] for x in results]
+    rows = [answer_scores(ans, names) for q in questions for ans in q["answers"]]
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(names))
+
+
+def score_matrix(rows, n_ans, max_ans):
+    """
+    Lay the answer rows out as (Q * (max_ans + 1)) x R, row q * (max_ans + 1) + a + 1 is
+    answer a of question q and row q * (max_ans + 1) stays zero for unanswered
+    """
+    n_ans = np.asarray(n_ans, dtype=np.int64)
+    width = int(max_ans) + 1
+
+    starts = np.concatenate([[0], np.cumsum(n_ans)[:-1]])
+    qq = np.repeat(np.arange(len(n_ans)), n_ans)
+    aa = np.arange(len(rows)) - np.repeat(starts, n_ans)
+
+    out = np.zeros((len(n_ans) * width, rows.shape[1]))
+    out[qq * width + aa + 1] = rows
+    return out
+
+
+class TraitScorer(object):
+    """
+    Sums answer score vectors for batches of sessions and picks the best result
+    """
+
+    def __init__(self, matrix, n_qs, max_ans, chunk=1 << 14, **kwargs):
+        self.kwargs = kwargs
+
+        self.matrix = matrix
+        self.n_qs = n_qs
+        self.width = int(max_ans) + 1
+        self.chunk = chunk
+
+        self.offsets = np.arange(n_qs, dtype=np.int64) * self.width
+
+    def totals(self, answers):
+        """
+        N x R summed scores for an N x Q answer matrix, negative answers are unanswered
+        """
+        answers = np.atleast_2d(np.asarray(answers, dtype=np.int64))
+        n_rows = answers.shape[0]
+        out = np.empty((n_rows, self.matrix.shape[1]))
+
+        # One-hot rows built a chunk at a time to keep the temporary small
+        cols = np.maximum(answers + 1, 0) + self.offsets
+        for start in range(0, n_rows, self.chunk):
+            stop = min(start + self.chunk, n_rows)
+            onehot = np.zeros((stop - start, self.matrix.shape[0]))
+            np.put_along_axis(onehot, cols[start:stop], 1.0, axis=1)
+            out[start:stop] = onehot @ self.matrix
+
+        return out
+
+    def select(self, answers):
+        return np.argmax(self.totals(answers), axis=1)
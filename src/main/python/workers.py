@@ -0,0 +1,16 @@
+"""
+Helpers for QRunnables that report back to the GUI thread through signals.
+"""
+
+
+def safe_emit(signals, name, *args):
+    """
+    Emit signals.<name> from a worker thread. Whoever owns the signals object can be
+    deleted while the worker is still busy (quitting mid-download), and then even looking
+    the signal up raises. Nobody is listening any more so there's nothing to do, but an
+    exception escaping QRunnable.run would abort the whole process.
+    """
+    try:
+        getattr(signals, name).emit(*args)
+    except RuntimeError:
+        pass
@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src" / "main" / "python"
+sys.path.insert(0, str(SRC))
+
+import json
+
+import numpy as np
+
+from engine import QuizEngine
+from sessionlog import SessionLog
+from analytics import Analytics
+
+
+def play(engine, rng, n_sessions):
+    for ii in range(n_sessions):
+        engine.reset()
+        while engine.next_question() is not None:
+            engine.record_answer(int(rng.integers(0, 4)))
+        engine.finalize()
+
+
+def test_stream_counts_by_bank_question(tmp_path):
+    log = SessionLog(tmp_path / "log")
+    engine = QuizEngine(SRC / "whatjediareyou.json", stream=True, max_questions=3, seed=0,
+                        session_log=log, analytics=True)
+    play(engine, np.random.default_rng(0), 50)
+    log.flush()
+
+    live = engine.analytics.quizzes["whatjediareyou"]
+    rebuilt = Analytics.from_log(tmp_path / "log").quizzes["whatjediareyou"]
+
+    # The log doesn't know how big the bank is, only what got asked
+    rebuilt.fit(live.answers.shape[0], live.answers.shape[1], len(live.results))
+
+    # Every bank question gets its own row, not its position in a session's sample
+    assert live.answers.shape[0] == engine.bank_size
+    assert live.answers[:, 1:].sum() == 50 * 3
+    assert np.array_equal(live.answers, rebuilt.answers)
+    assert np.array_equal(live.results, rebuilt.results)
+    assert live.summary()["reached"] == rebuilt.summary()["reached"]
+
+
+def test_early_finish_only_counts_asked(tmp_path):
+    # 5 questions all scoring A, so A has it won after 3
+    quiz = {
+        "Quiz Name": "Traits",
+        "Questions": [
+            {"text": f"Question {ii}", "answers": [{"text": "a", "scores": {"A": 1}}, {"text": "b", "scores": {"B": 1}}]}
+            for ii in range(5)
+        ],
+        "Results": [{"Name": "A", "weight": 1}, {"Name": "B", "weight": 1}],
+    }
+    quiz_file = tmp_path / "traits.json"
+    quiz_file.write_text(json.dumps(quiz))
+
+    log = SessionLog(tmp_path / "log")
+    engine = QuizEngine(quiz_file, session_log=log, analytics=True)
+    engine.reset()
+    n_answered = 0
+    while engine.next_question() is not None:
+        engine.record_answer(0)
+        n_answered += 1
+    engine.finalize()
+    log.flush()
+    assert n_answered == 3
+
+    for stats in (engine.analytics.quizzes["traits"], Analytics.from_log(tmp_path / "log").quizzes["traits"]):
+        summ = stats.summary()
+        assert summ["reached"][:4] == [1, 1, 1, 1] and not any(summ["reached"][4:])
+        assert sum(summ["answers"]["unanswered"]) == 0
+        assert stats.answers[:, 1].sum() == 3
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+import json
+
+SRC = Path(__file__).resolve().parent.parent / "src" / "main" / "python"
+sys.path.insert(0, str(SRC))
+
+from engine import QuizEngine
+
+
+def trait_quiz():
+    return {
+        "Quiz Name": "Traits",
+        "Options": {"Max Questions": 3},
+        "Questions": [
+            {"text": f"Question {ii}", "answers": [{"text": "a", "scores": {"A": 1}}, {"text": "b", "scores": {"B": 1}}]}
+            for ii in range(6)
+        ],
+        "Results": [{"Name": "A", "weight": 1}, {"Name": "B", "weight": 1}],
+    }
+
+
+def test_stream_json_file():
+    engine = QuizEngine(SRC / "whatjediareyou.json", stream=True, max_questions=5, seed=0)
+    assert engine.n_qs == 5
+    assert engine.title == "What Jedi are You?"
+
+    engine.reset()
+    assert engine.n_qs == 5
+
+
+def test_stream_json_file_traits(tmp_path):
+    quiz_file = tmp_path / "traits.json"
+    quiz_file.write_text(json.dumps(trait_quiz()))
+
+    engine = QuizEngine(quiz_file, stream=True, seed=0)
+    assert engine.scoring == "traits"
+    assert engine.n_qs == 3
+
+    assert engine.results[engine.select_results([[1, 1, 1]])[0]]["Name"] == "B"
@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+import json
+
+SRC = Path(__file__).resolve().parent.parent / "src" / "main" / "python"
+sys.path.insert(0, str(SRC))
+
+import numpy as np
+import pytest
+
+from engine import QuizEngine
+from quizbin import compile_quiz, CompiledQuiz
+from traits import answer_text
+from test_engine import trait_quiz
+
+
+def random_answers(engine, n, rng):
+    n_ans = np.array([len(q["answers"]) for q in engine.questions])
+    return (rng.random((n, len(n_ans))) * n_ans).astype(np.int64)
+
+
+@pytest.mark.parametrize("name", ["jedi", "traits"])
+def test_compiled_matches_json(tmp_path, name):
+    if name == "jedi":
+        quiz_file = SRC / "whatjediareyou.json"
+    else:
+        quiz_file = tmp_path / "traits.json"
+        quiz_file.write_text(json.dumps(trait_quiz()))
+    with open(quiz_file) as ff:
+        config = json.load(ff)
+
+    out = compile_quiz(quiz_file, tmp_path / f"{name}.qzb")
+    quiz = CompiledQuiz(out)
+    assert quiz.n_qs == len(config["Questions"])
+    assert list(quiz.questions) == [{"text": q["text"], "answers": [answer_text(a) for a in q["answers"]]}
+                                    for q in config["Questions"]]
+    assert quiz.results == config["Results"]
+    assert (quiz.scores is not None) == (name == "traits")
+    quiz.close()
+
+    from_json = QuizEngine(quiz_file)
+    compiled = QuizEngine(out)
+    assert compiled.scoring == from_json.scoring
+
+    answers = random_answers(from_json, 500, np.random.default_rng(0))
+    assert np.array_equal(compiled.select_results(answers), from_json.select_results(answers))
+
+
+def test_not_compiled(tmp_path):
+    path = tmp_path / "junk.qzb"
+    path.write_bytes(b"QZB1" + b"\x01" + b"\x00" * 200)
+    with pytest.raises(ValueError):
+        CompiledQuiz(path)
@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+import asyncio
+
+SRC = Path(__file__).resolve().parent.parent / "src" / "main" / "python"
+sys.path.insert(0, str(SRC))
+
+import pytest
+
+from server import QuizServer, HTTPError
+
+
+def read(server, data):
+    async def go():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await server.read_request(reader)
+    return asyncio.run(go())
+
+
+def test_read_request(tmp_path):
+    server = QuizServer(tmp_path, analytics=True)
+    request = read(server, b'POST /sessions HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}')
+    assert request == ("POST", "/sessions", b"{}", True)
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5", b"1e3"])
+def test_bad_content_length(tmp_path, length):
+    server = QuizServer(tmp_path, analytics=True)
+    with pytest.raises(HTTPError) as err:
+        read(server, b"POST /sessions HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n{}")
+    assert err.value.status == 400
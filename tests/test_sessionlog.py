@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src" / "main" / "python"
+sys.path.insert(0, str(SRC))
+
+import numpy as np
+
+from sessionlog import SessionLog, load_log
+
+
+def test_round_trip(tmp_path):
+    log = SessionLog(tmp_path, flush_every=1e9)
+    log.record("small", [2, 0, 1], [1, 0, 3], 4, 100.0, 102.5)
+    log.record("small", [1], [2], 0, 200.0, 201.0)
+    # Big enough bank that question indices need the u4 column
+    log.record("big", [70000, 3, 65536], [1, 2, 300], 7, 300.0, 310.0)
+    log.flush()
+
+    cols = load_log(tmp_path)
+    small = cols["small"]
+    assert small["started"].tolist() == [100.0, 200.0]
+    assert small["duration"].tolist() == [2.5, 1.0]
+    assert small["result"].tolist() == [4, 0]
+    assert small["asked"].tolist() == [3, 1]
+    assert small["questions"].tolist() == [2, 0, 1, 1]
+    assert small["codes"].tolist() == [1, 0, 3, 2]
+
+    big = cols["big"]
+    assert big["asked"].tolist() == [3]
+    assert big["questions"].tolist() == [70000, 3, 65536]
+    assert big["codes"].tolist() == [1, 2, 300]
+
+    assert list(load_log(tmp_path, quiz="big")) == ["big"]
+
+
+def test_partly_written_block(tmp_path):
+    log = SessionLog(tmp_path, flush_every=1e9)
+    log.record("quiz", [0, 1], [1, 2], 1, 100.0, 101.0)
+    log.flush()
+    log.record("quiz", [1, 0], [2, 1], 0, 200.0, 201.0)
+    log.flush()
+    log.close()
+
+    # A crash half way through the second block only loses that block
+    path = next(tmp_path.glob("*.qzl"))
+    path.write_bytes(path.read_bytes()[:-3])
+    assert load_log(tmp_path)["quiz"]["started"].tolist() == [100.0]